@@ -0,0 +1,165 @@
+import cProfile
+import io
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils.crypto import constant_time_compare
+
+from .routers import choose_replica, pin_reads_to, reset_read_pin
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Обеспечивает чтение собственных записей при работе с репликами.
+
+    Запросы с изменяющими методами и все запросы клиента в течение
+    `DB_REPLICA_STICKY_SECONDS` после записи читают из основной базы данных,
+    пока реплики догоняют её. Остальные запросы читают из одной реплики,
+    выбранной на весь запрос.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+    COOKIE_NAME = 'db_primary_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        is_write = request.method not in self.SAFE_METHODS
+        if is_write or self.COOKIE_NAME in request.COOKIES:
+            token = pin_reads_to(DEFAULT_DB_ALIAS)
+        else:
+            token = pin_reads_to(choose_replica())
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_read_pin(token)
+
+        sticky_seconds = getattr(settings, 'DB_REPLICA_STICKY_SECONDS', 0)
+        if is_write and sticky_seconds and getattr(settings, 'DATABASE_REPLICAS', []):
+            response.set_cookie(self.COOKIE_NAME, '1', max_age=sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+
+class RequestProfilingMiddleware:
+    """
+    Профилирование отдельного запроса по требованию.
+
+    Включается настройкой `PROFILING_ENABLED`, иначе middleware не подключается
+    и не даёт накладных расходов. Запрос профилируется при заголовке
+    `X-Profile: 1` или параметре `?profile=1`, если пользователь - сотрудник
+    (is_staff) или передан заголовок `X-Profile-Token` с `PROFILING_SECRET`.
+
+    В `PROFILING_DIR` сохраняются профиль cProfile (`<id>.prof`, для pstats/snakeviz)
+    и текстовый отчёт (`<id>.txt`): время, запросы к БД, самые затратные функции
+    и места наибольших выделений памяти по tracemalloc. Идентификатор отчёта
+    возвращается в заголовке `X-Profile-Id`.
+    """
+    HEADER = 'X-Profile'
+    TOKEN_HEADER = 'X-Profile-Token'
+    QUERY_PARAM = 'profile'
+    TOP_FUNCTIONS = 40
+    TRACEBACK_LIMIT = 10
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        if not self.is_requested(request) or not self.is_allowed(request):
+            return self.get_response(request)
+        # tracemalloc и профилировщик глобальны для процесса: одновременно профилируется один запрос
+        if not self.lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.profile(request)
+        finally:
+            self.lock.release()
+
+    def is_requested(self, request) -> bool:
+        return request.headers.get(self.HEADER) == '1' or request.GET.get(self.QUERY_PARAM) == '1'
+
+    def is_allowed(self, request) -> bool:
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+        secret = getattr(settings, 'PROFILING_SECRET', '')
+        return bool(secret) and constant_time_compare(request.headers.get(self.TOKEN_HEADER, ''), secret)
+
+    def profile(self, request):
+        profiler = cProfile.Profile()
+        tracemalloc.start(self.TRACEBACK_LIMIT)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                # Запросы учитываются по всем базам данных, включая реплики для чтения
+                queries = {
+                    connection.alias: stack.enter_context(CaptureQueriesContext(connection))
+                    for connection in connections.all()
+                }
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+            elapsed = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        profile_id = self.save(request, response, profiler, snapshot, peak, elapsed, queries)
+        response[f'{self.HEADER}-Id'] = profile_id
+        return response
+
+    @staticmethod
+    def queries_time(captured: CaptureQueriesContext) -> float:
+        return sum(float(query['time']) for query in captured)
+
+    def save(self, request, response, profiler, snapshot, peak, elapsed, queries) -> str:
+        directory = Path(settings.PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+        profile_id = f'{time.strftime("%Y%m%d-%H%M%S")}-{time.time_ns() % 10**9:09d}-{request.method}-{slug}'
+        profiler.dump_stats(directory / f'{profile_id}.prof')
+
+        stats_output = io.StringIO()
+        pstats.Stats(profiler, stream=stats_output).sort_stats('cumulative').print_stats(self.TOP_FUNCTIONS)
+
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        allocations = snapshot.statistics('lineno')[:settings.PROFILING_TOP_ALLOCATIONS]
+
+        lines = [
+            f'{request.method} {request.get_full_path()} -> {response.status_code}',
+            f'Время: {elapsed * 1000:.1f} мс',
+            f'Пиковая память (tracemalloc): {peak / 1024:.1f} КиБ',
+            f'Запросов к БД: {sum(len(captured) for captured in queries.values())}, '
+            f'время БД: {sum(self.queries_time(captured) for captured in queries.values()) * 1000:.1f} мс',
+            *(
+                f'  {alias}: {len(captured)} запросов, {self.queries_time(captured) * 1000:.1f} мс'
+                for alias, captured in queries.items()
+                if len(captured)
+            ),
+            '',
+            'Наибольшие выделения памяти:',
+            *(str(statistic) for statistic in allocations),
+            '',
+            'Профиль (по накопленному времени):',
+            stats_output.getvalue(),
+        ]
+        (directory / f'{profile_id}.txt').write_text('\n'.join(lines), encoding='utf-8')
+        return profile_id
@@ -0,0 +1,73 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_read_alias: ContextVar[str | None] = ContextVar('read_alias', default=None)
+
+
+def pin_reads_to(alias: str | None):
+    """
+    Направляет чтение текущего запроса (потока или задачи) в базу данных alias
+    (None - выбрать реплику при первом чтении). Возвращает токен для сброса
+    через `reset_read_pin`.
+    """
+    return _read_alias.set(alias)
+
+
+def reset_read_pin(token) -> None:
+    _read_alias.reset(token)
+
+
+def pinned_read_alias() -> str | None:
+    return _read_alias.get()
+
+
+def choose_replica() -> str:
+    ''' Случайная реплика из `DATABASE_REPLICAS` или основная база, если реплик нет '''
+    replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+class PrimaryReplicaRouter:
+    """
+    Роутер баз данных: запись идёт в основную базу, чтение моделей справочника -
+    в одну из реплик из `DATABASE_REPLICAS`. Реплика выбирается один раз на запрос
+    (см. `ReplicaStickinessMiddleware`), поэтому основной запрос и prefetch_related
+    читают согласованные данные; связанные объекты читаются из базы экземпляра.
+    Без настроенных реплик, внутри транзакции основной базы или при привязке
+    к основной базе (после записи клиента) чтение идёт в основную базу.
+    """
+    route_app_labels = {'guide'}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in self.route_app_labels:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Внутри транзакции основной базы реплика не видит её незафиксированных записей
+            return DEFAULT_DB_ALIAS
+        alias = pinned_read_alias()
+        if alias != DEFAULT_DB_ALIAS and alias not in replicas:
+            # Вне запроса (команды управления) реплика выбирается один раз на поток
+            alias = choose_replica()
+            pin_reads_to(alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *getattr(settings, 'DATABASE_REPLICAS', [])}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, 'DATABASE_REPLICAS', [])
@@ -47,10 +47,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RequestProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,6 +93,10 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
 }
 
+# Заранее сгенерированная схема (см. docker/backend/server-entrypoint.sh) и время её кэширования клиентами
+SPECTACULAR_SCHEMA_DIR = Path(os.environ.get('SCHEMA_DIR', BASE_DIR / 'schema'))
+SPECTACULAR_SCHEMA_MAX_AGE = int(os.environ.get('SCHEMA_MAX_AGE', 3600))
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -102,9 +108,70 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        # Постоянные соединения: время жизни соединения в секундах (0 - закрывать после запроса)
+        # и проверка соединения перед повторным использованием.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'true').lower() in ('1', 'true'),
+        'OPTIONS': {},
+    }
+}
+
+# Пул соединений psycopg 3. Несовместим с постоянными соединениями, поэтому при включении
+# пула CONN_MAX_AGE принудительно сбрасывается в 0: соединение возвращается в пул после запроса.
+if os.environ.get('DB_POOL', '').lower() in ('1', 'true'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 4)),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+
+# Реплики для чтения: список `host[:port]` через запятую. Остальные параметры
+# подключения совпадают с основной базой данных.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    replica_host, _, replica_port = replica.strip().partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'OPTIONS': {**DATABASES['default']['OPTIONS']},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Сколько секунд после записи клиент читает из основной базы данных
+DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+# Профилирование отдельных запросов (см. core.middleware.RequestProfilingMiddleware)
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true')
+PROFILING_SECRET = os.environ.get('PROFILING_SECRET', '')
+PROFILING_DIR = Path(os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles'))
+PROFILING_TOP_ALLOCATIONS = int(os.environ.get('PROFILING_TOP_ALLOCATIONS', 30))
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Кэш общий для всех воркеров и контейнеров backend (в т.ч. метки версий кэшей процессов),
+# поэтому по умолчанию хранится в базе данных; таблица создаётся командой createcachetable
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'guide_cache'),
     }
 }
 
+# Через сколько секунд незавершённый импорт файла материалов считается прерванным и может быть перехвачен
+MATERIAL_IMPORT_CLAIM_TIMEOUT = int(os.environ.get('MATERIAL_IMPORT_CLAIM_TIMEOUT', 600))
+
+# Размер LRU-кэша процесса для разрешения категорий по коду и id
+CATEGORY_LOOKUP_CACHE_SIZE = int(os.environ.get('CATEGORY_LOOKUP_CACHE_SIZE', 50000))
+# Не реже чем раз в столько секунд метка версии сверяется и внутри запроса или команды управления
+CATEGORY_LOOKUP_RECHECK_SECONDS = float(os.environ.get('CATEGORY_LOOKUP_RECHECK_SECONDS', 5))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
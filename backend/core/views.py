@@ -0,0 +1,55 @@
+import hashlib
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+
+class PrecomputedSchemaView(SpectacularAPIView):
+    """
+    Отдаёт OpenAPI схему, заранее сгенерированную командой `spectacular`
+    в `SPECTACULAR_SCHEMA_DIR`, с заголовками кэширования (Cache-Control, ETag).
+    Если файл схемы не найден или запрошены язык/версия схемы, она генерируется на лету.
+    """
+    schema_files = {
+        'openapi': 'schema.yaml',
+        'yaml': 'schema.yaml',
+        'openapi-json': 'schema.json',
+        'json': 'schema.json',
+    }
+    _cache: dict[Path, tuple[float, bytes, str]] = {}
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        renderer, media_type = self.perform_content_negotiation(request)
+        filename = self.schema_files.get(renderer.format)
+        loaded = None
+        if filename and not request.GET.keys() & {'lang', 'version'}:
+            loaded = self.load_schema(Path(settings.SPECTACULAR_SCHEMA_DIR) / filename)
+        if loaded is None:
+            return super().get(request, *args, **kwargs)
+
+        content, etag = loaded
+        response = HttpResponse(content, content_type=media_type)
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.SPECTACULAR_SCHEMA_MAX_AGE)
+        # If-None-Match разбирается по RFC 9110: списки, слабые валидаторы и *
+        return get_conditional_response(request, etag=etag, response=response)
+
+    @classmethod
+    def load_schema(cls, path: Path) -> tuple[bytes, str] | None:
+        ''' Читает файл схемы один раз на процесс; перечитывает только при изменении файла '''
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            return None
+
+        cached = cls._cache.get(path)
+        if cached is None or cached[0] != mtime:
+            content = path.read_bytes()
+            cached = cls._cache[path] = (mtime, content, quote_etag(hashlib.sha1(content).hexdigest()))
+        return cached[1], cached[2]
@@ -0,0 +1,155 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.db import BaseDatabaseCache
+from django.db import router, transaction
+
+from .models import Category
+
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryLookupCache:
+    """
+    Ограниченный LRU-кэш процесса для разрешения ссылок на категории:
+    код -> id и id -> id родителя.
+
+    Кэш сбрасывается сигналами модели Category и общей для всех контейнеров
+    меткой версии в кэше Django (по умолчанию - в базе данных): процесс,
+    изменивший категории, меняет метку, остальные сверяют её при первом
+    обращении в каждом запросе, а вне запросов (команды управления) - не реже
+    раза в recheck_seconds, и очищают свой кэш.
+    Отсутствующие категории не кэшируются, поэтому новые категории не требуют сброса.
+    """
+    VERSION_KEY = 'guide:category-lookup-version'
+
+    def __init__(self, maxsize: int, recheck_seconds: float) -> None:
+        self.maxsize = maxsize
+        self.recheck_seconds = recheck_seconds
+        self.checked_at = 0.0
+        self.code_to_id: OrderedDict[int, int] = OrderedDict()
+        self.id_to_parent: OrderedDict[int, int | None] = OrderedDict()
+        self.version = None
+        self.stale = True
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def ids_for_codes(self, codes: Iterable[int]) -> dict[int, int]:
+        ''' id существующих категорий по кодам; недостающие выбираются одним запросом '''
+        return self.lookup(self.code_to_id, set(codes), 'code')
+
+    def parents_for_ids(self, ids: Iterable[int]) -> dict[int, int | None]:
+        ''' id родителя существующих категорий по их id; недостающие выбираются одним запросом '''
+        return self.lookup(self.id_to_parent, set(ids), 'id')
+
+    def lookup(self, mapping: OrderedDict, keys: set, field: str) -> dict:
+        self.check_version()
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in mapping:
+                    mapping.move_to_end(key)
+                    found[key] = mapping[key]
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        missing = keys - found.keys()
+        if not missing:
+            return found
+
+        rows = list(
+            Category.objects
+            .filter(**{f'{field}__in': missing})
+            .order_by()
+            .values_list('code', 'id', 'parent_id')
+        )
+        with self.lock:
+            for code, category_id, parent_id in rows:
+                self.remember(self.code_to_id, code, category_id)
+                self.remember(self.id_to_parent, category_id, parent_id)
+                if field == 'code':
+                    found[code] = category_id
+                else:
+                    found[category_id] = parent_id
+        return found
+
+    def remember(self, mapping: OrderedDict, key, value) -> None:
+        mapping[key] = value
+        mapping.move_to_end(key)
+        while len(mapping) > self.maxsize:
+            mapping.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.code_to_id.clear()
+            self.id_to_parent.clear()
+
+    def mark_stale(self, **kwargs) -> None:
+        ''' Следующее обращение сверит метку версии (вызывается в начале запроса) '''
+        self.stale = True
+
+    def check_version(self) -> None:
+        now = time.monotonic()
+        if not self.stale and now - self.checked_at < self.recheck_seconds:
+            return
+        self.stale = False
+        self.checked_at = now
+        try:
+            version = self.read_version()
+        except Exception:
+            # Недоступный общий кэш не должен ломать запись: без метки версии локальный кэш не используется
+            logger.warning('Не удалось прочитать метку версии кэша категорий', exc_info=True)
+            self.clear()
+            return
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def read_version(self):
+        # Запрос к кэшу в базе данных выполняется в точке сохранения,
+        # чтобы его ошибка не прерывала внешнюю транзакцию
+        backend = caches[DEFAULT_CACHE_ALIAS]
+        savepoint = (
+            transaction.atomic(using=router.db_for_read(backend.cache_model_class))
+            if isinstance(backend, BaseDatabaseCache)
+            else nullcontext()
+        )
+        with savepoint:
+            return backend.get(self.VERSION_KEY)
+
+    def invalidate(self) -> None:
+        ''' Сбрасывает кэш этого процесса и меняет метку версии для остальных воркеров '''
+        self.clear()
+        self.version = uuid.uuid4().hex
+        try:
+            cache.set(self.VERSION_KEY, self.version, None)
+        except Exception:
+            logger.warning('Не удалось обновить метку версии кэша категорий', exc_info=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'pid': os.getpid(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'codes': len(self.code_to_id),
+            'ids': len(self.id_to_parent),
+            'maxsize': self.maxsize,
+        }
+
+
+category_lookup = CategoryLookupCache(
+    settings.CATEGORY_LOOKUP_CACHE_SIZE,
+    settings.CATEGORY_LOOKUP_RECHECK_SECONDS,
+)
@@ -0,0 +1,111 @@
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Category, Material, MaterialPrice
+from .cache import category_lookup
+
+
+SUBTREE_CTE = '''
+    WITH RECURSIVE subtree (id) AS (
+        SELECT id FROM {category} WHERE id = %s
+        UNION
+        SELECT child.id FROM {category} AS child JOIN subtree ON child.parent_id = subtree.id
+    )
+'''
+
+ANCESTORS_CTE = '''
+    WITH RECURSIVE ancestors (id, parent_id) AS (
+        SELECT id, parent_id FROM {category} WHERE id = %s
+        UNION
+        SELECT parent.id, parent.parent_id FROM {category} AS parent JOIN ancestors ON parent.id = ancestors.parent_id
+    )
+'''
+
+
+def ancestors_sql(using: str) -> str:
+    ''' Запрос id категории (параметр) и всех её предков '''
+    category_table = connections[using].ops.quote_name(Category._meta.db_table)
+    return ANCESTORS_CTE.format(category=category_table) + ' SELECT id FROM ancestors'
+
+
+def creates_cycle(category_id: int, parent_id: int | None, using: str | None = None) -> bool:
+    """
+    Проверяет, образует ли перенос категории под parent_id цикл, то есть
+    является ли parent_id самой категорией или её потомком. Цепочка предков
+    parent_id проверяется одним рекурсивным запросом.
+    """
+    if parent_id is None:
+        return False
+    if parent_id == category_id:
+        return True
+
+    using = using or router.db_for_write(Category)
+    return Category.objects.using(using).filter(
+        id=category_id,
+    ).filter(
+        id__in=RawSQL(ancestors_sql(using), [parent_id]),
+    ).exists()
+
+
+def move_subtree(category_id: int, parent_id: int | None) -> bool:
+    """
+    Переносит категорию вместе с поддеревом под parent_id (None - в корень).
+
+    Переносимая категория и цепочка предков нового родителя блокируются одним
+    запросом в порядке id, поэтому встречные переносы не взаимоблокируются, а
+    проверка цикла после блокировки видит зафиксированный результат встречного
+    переноса. Поддерево хранится только через parent_id, так что перенос - один
+    UPDATE. Возвращает False, если перенос образовал бы цикл.
+    """
+    using = router.db_for_write(Category)
+
+    with transaction.atomic(using=using):
+        locked = Q(id=category_id)
+        if parent_id is not None:
+            locked |= Q(id__in=RawSQL(ancestors_sql(using), [parent_id]))
+        list(Category.objects.using(using).select_for_update().filter(locked).order_by('id').values_list('id'))
+        if creates_cycle(category_id, parent_id, using=using):
+            return False
+
+        Category.objects.using(using).filter(id=category_id).update(parent_id=parent_id)
+        category_lookup.clear()
+        transaction.on_commit(category_lookup.invalidate, using=using)
+    return True
+
+
+def delete_subtree(category_id: int) -> tuple[int, int]:
+    """
+    Удаляет категорию со всеми потомками, их материалами и историей цен материалов.
+
+    В отличие от каскадного удаления Django, объекты не загружаются в Python:
+    поддерево определяется рекурсивным CTE, а удаление выполняется тремя
+    запросами DELETE. Возвращает количество удалённых категорий и материалов.
+    """
+    using = router.db_for_write(Category)
+    connection = connections[using]
+    category_table = connection.ops.quote_name(Category._meta.db_table)
+    material_table = connection.ops.quote_name(Material._meta.db_table)
+    price_table = connection.ops.quote_name(MaterialPrice._meta.db_table)
+    subtree = SUBTREE_CTE.format(category=category_table)
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            f'{subtree} DELETE FROM {price_table} WHERE material_id IN ('
+            f'SELECT id FROM {material_table} WHERE category_id IN (SELECT id FROM subtree))',
+            [category_id],
+        )
+        cursor.execute(
+            f'{subtree} DELETE FROM {material_table} WHERE category_id IN (SELECT id FROM subtree)',
+            [category_id],
+        )
+        materials_deleted = cursor.rowcount
+        cursor.execute(
+            f'{subtree} DELETE FROM {category_table} WHERE id IN (SELECT id FROM subtree)',
+            [category_id],
+        )
+        categories_deleted = cursor.rowcount
+        category_lookup.clear()
+        transaction.on_commit(category_lookup.invalidate, using=using)
+
+    return categories_deleted, materials_deleted
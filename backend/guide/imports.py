@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MaterialImport
+
+
+CLAIMED = 'claimed'
+DUPLICATE = 'duplicate'
+IN_PROGRESS = 'in_progress'
+
+
+def claim_import(content_hash: str, filename: str, force: bool = False) -> tuple[MaterialImport, str]:
+    """
+    Захватывает импорт файла по хешу содержимого до его разбора.
+
+    Запись со статусом running вставляется отдельным коротким запросом, поэтому
+    повторная загрузка того же файла во время импорта сразу её видит. Возвращает
+    запись и исход: claimed - файл нужно импортировать, duplicate - файл уже
+    импортирован (запись хранит итог), in_progress - файл импортируется другим
+    запросом. Захват running-записи старше `MATERIAL_IMPORT_CLAIM_TIMEOUT` секунд
+    (упавший воркер) и завершённого импорта при force перехватывается.
+    """
+    record, created = MaterialImport.objects.get_or_create(
+        content_hash=content_hash,
+        defaults={'filename': filename},
+    )
+    if created:
+        return record, CLAIMED
+    if record.status == MaterialImport.Status.COMPLETED and not force:
+        return record, DUPLICATE
+
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.MATERIAL_IMPORT_CLAIM_TIMEOUT)
+    claimed = MaterialImport.objects.filter(
+        Q(status=MaterialImport.Status.COMPLETED) | Q(claimed_at__lt=stale_before),
+        pk=record.pk,
+    ).update(status=MaterialImport.Status.RUNNING, claimed_at=now)
+    return record, CLAIMED if claimed else IN_PROGRESS
+
+
+def complete_import(record: MaterialImport, filename: str, result: dict) -> None:
+    ''' Отмечает импорт завершённым; вызывается в транзакции создания материалов '''
+    completed_at = timezone.now()
+    MaterialImport.objects.filter(pk=record.pk).update(
+        filename=filename,
+        status=MaterialImport.Status.COMPLETED,
+        result=result,
+        completed_at=completed_at,
+    )
+    record.filename = filename
+    record.status = MaterialImport.Status.COMPLETED
+    record.result = result
+    record.completed_at = completed_at
+
+
+def release_import(record: MaterialImport) -> None:
+    """
+    Снимает захват неудавшегося импорта: повторный принудительный импорт
+    возвращает прежний итог, новый захват удаляется.
+    """
+    if record.status == MaterialImport.Status.COMPLETED:
+        MaterialImport.objects.filter(pk=record.pk).update(
+            status=MaterialImport.Status.COMPLETED,
+            claimed_at=record.claimed_at,
+        )
+    else:
+        MaterialImport.objects.filter(pk=record.pk, status=MaterialImport.Status.RUNNING).delete()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from guide.prices import HISTORY_START, backfill_prices
+from guide.utils import parse_moment
+
+
+class Command(BaseCommand):
+    help = (
+        'Записывает в историю цен текущую стоимость материалов, у которых истории нет '
+        '(созданных до её ведения). Повторный запуск ничего не добавляет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--valid-from',
+            help='С какого момента действуют записанные цены (дата или дата-время ISO 8601, по умолчанию 1970-01-01)',
+        )
+
+    def handle(self, *args, **options):
+        valid_from = HISTORY_START
+        if options['valid_from']:
+            valid_from = parse_moment(options['valid_from'])
+            if valid_from is None:
+                raise CommandError('Ожидается дата или дата-время в формате ISO 8601.')
+
+        created = backfill_prices(valid_from)
+        self.stdout.write(self.style.SUCCESS(f'Записано цен: {created}'))
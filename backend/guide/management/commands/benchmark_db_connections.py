@@ -0,0 +1,80 @@
+import copy
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+
+from guide.models import Material
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержку небольшого чтения (как в MaterialDetailView.get) '
+        'при новом соединении на каждый запрос и при текущих настройках соединений с БД.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--iterations', type=int, default=200, help='Количество имитируемых запросов')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Псевдоним базы данных')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        iterations = options['iterations']
+        material_id = Material.objects.using(alias).values_list('id', flat=True).first() or 0
+
+        results = {
+            'Новое соединение на запрос': self.measure_fresh(alias, material_id, iterations),
+            'Текущие настройки': self.measure_configured(alias, material_id, iterations),
+        }
+
+        settings_dict = connections[alias].settings_dict
+        self.stdout.write(
+            f"CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']}, "
+            f"CONN_HEALTH_CHECKS={settings_dict['CONN_HEALTH_CHECKS']}, "
+            f"pool={bool(settings_dict['OPTIONS'].get('pool'))}"
+        )
+        for title, timings in results.items():
+            self.stdout.write(f'{title}: {self.format_timings(timings)}')
+
+    def measure_fresh(self, alias: str, material_id: int, iterations: int) -> list[float]:
+        ''' Каждая итерация открывает и закрывает собственное соединение, как при CONN_MAX_AGE=0 без пула '''
+        settings_dict = copy.deepcopy(connections[alias].settings_dict)
+        settings_dict['CONN_MAX_AGE'] = 0
+        settings_dict['OPTIONS'].pop('pool', None)
+
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            wrapper = connections[alias].__class__(settings_dict, alias)
+            try:
+                with wrapper.cursor() as cursor:
+                    self.read_material(cursor, material_id)
+            finally:
+                wrapper.close()
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def measure_configured(self, alias: str, material_id: int, iterations: int) -> list[float]:
+        ''' Итерации используют штатное соединение и закрываются так же, как по сигналу request_finished '''
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            close_old_connections()
+            with connections[alias].cursor() as cursor:
+                self.read_material(cursor, material_id)
+            close_old_connections()
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    @staticmethod
+    def read_material(cursor, material_id: int) -> None:
+        table = Material._meta.db_table
+        cursor.execute(f'SELECT id, category_id, code, name, cost FROM {table} WHERE id = %s', [material_id])
+        cursor.fetchone()
+
+    @staticmethod
+    def format_timings(timings: list[float]) -> str:
+        ms = sorted(t * 1000 for t in timings)
+        p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+        return f'среднее {statistics.mean(ms):.2f} мс, p50 {statistics.median(ms):.2f} мс, p95 {p95:.2f} мс'
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from guide.models import Category, Material
+from guide.serializers import MaterialBulkUpdateSerializer, MaterialBulkDeleteSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет пропускную способность массового обновления и удаления материалов (строк в секунду). '
+        'Все изменения выполняются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--rows', type=int, default=10000, help='Количество материалов')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+
+        with transaction.atomic():
+            category = Category.objects.create(
+                code=(Category.objects.aggregate(code=Max('code'))['code'] or 0) + 1,
+                name='benchmark',
+            )
+            first_code = (Material.objects.aggregate(code=Max('code'))['code'] or 0) + 1
+            materials = Material.objects.bulk_create(
+                [
+                    Material(category=category, code=first_code + i, name=f'benchmark {i}', cost=i)
+                    for i in range(rows)
+                ],
+                batch_size=MaterialBulkUpdateSerializer.BATCH_SIZE,
+            )
+            ids = [material.id for material in materials]
+
+            for offset in range(0, rows, MaterialBulkUpdateSerializer.MAX_ITEMS):
+                chunk = ids[offset:offset + MaterialBulkUpdateSerializer.MAX_ITEMS]
+                started = time.perf_counter()
+                serializer = MaterialBulkUpdateSerializer(
+                    data={'items': [{'id': material_id, 'cost': '1.00'} for material_id in chunk]}
+                )
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                self.report('Обновление', len(chunk), time.perf_counter() - started)
+
+            for offset in range(0, rows, MaterialBulkDeleteSerializer.MAX_ITEMS):
+                chunk = ids[offset:offset + MaterialBulkDeleteSerializer.MAX_ITEMS]
+                started = time.perf_counter()
+                serializer = MaterialBulkDeleteSerializer(data={'ids': chunk})
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                self.report('Удаление', len(chunk), time.perf_counter() - started)
+
+            transaction.set_rollback(True)
+
+    def report(self, title: str, rows: int, elapsed: float) -> None:
+        self.stdout.write(f'{title}: {rows} строк за {elapsed:.3f} с, {rows / elapsed / 1000:.1f} тыс. строк/с')
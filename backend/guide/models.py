@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -44,4 +45,61 @@ class Material(models.Model):
     class Meta:
         verbose_name = _('Материал')
         verbose_name_plural = _('Материалы')
-        ordering = ['category__id', 'code']
\ No newline at end of file
+        ordering = ['category__id', 'code']
+
+
+class MaterialPrice(models.Model):
+    ''' Запись истории цен материала: стоимость, действующая с момента valid_from '''
+    material = models.ForeignKey(
+        Material,
+        verbose_name=_('Материал'),
+        on_delete=models.CASCADE,
+        related_name='prices',
+    )
+
+    cost = models.DecimalField(verbose_name=_('Стоимость'), max_digits=12, decimal_places=2)
+    valid_from = models.DateTimeField(verbose_name=_('Действует с'), default=timezone.now)
+
+    def __str__(self) -> str:
+        return f'{self.material_id}: {self.cost} с {self.valid_from:%Y-%m-%d %H:%M}'
+
+    class Meta:
+        verbose_name = _('Цена материала')
+        verbose_name_plural = _('История цен материалов')
+        ordering = ['material__id', 'valid_from']
+        indexes = [
+            models.Index(fields=['material', 'valid_from'], name='guide_price_material_from_idx'),
+        ]
+
+
+class MaterialImport(models.Model):
+    """
+    Импорт материалов из файла, для повторной загрузки тех же байтов без разбора.
+
+    Запись создаётся до разбора файла (статус running) и служит захватом:
+    повторная загрузка того же файла во время импорта не разбирает его заново.
+    claimed_at - время последнего захвата, completed_at - завершения импорта.
+    """
+    class Status(models.TextChoices):
+        RUNNING = 'running', _('Выполняется')
+        COMPLETED = 'completed', _('Завершён')
+
+    content_hash = models.CharField(verbose_name=_('SHA-256 содержимого'), max_length=64, unique=True)
+    filename = models.CharField(verbose_name=_('Имя файла'), max_length=255)
+    status = models.CharField(
+        verbose_name=_('Статус'),
+        max_length=16,
+        choices=Status.choices,
+        default=Status.RUNNING,
+    )
+    result = models.JSONField(verbose_name=_('Итог импорта'), default=dict)
+    claimed_at = models.DateTimeField(verbose_name=_('Дата захвата'), default=timezone.now)
+    completed_at = models.DateTimeField(verbose_name=_('Дата импорта'), null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f'{self.filename} ({self.content_hash[:12]})'
+
+    class Meta:
+        verbose_name = _('Импорт материалов')
+        verbose_name_plural = _('Импорты материалов')
+        ordering = ['-claimed_at']
@@ -0,0 +1,102 @@
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet, Subquery
+from django.utils import timezone
+
+from .models import Material, MaterialPrice
+
+
+BATCH_SIZE = 1000
+
+# Начало действия цен, известных до ведения истории: момент их установки неизвестен
+HISTORY_START = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def price_at(moment: datetime) -> Subquery:
+    ''' Подзапрос стоимости материала (OuterRef pk), действовавшей в момент moment '''
+    return Subquery(
+        MaterialPrice.objects
+        .filter(material=OuterRef('pk'), valid_from__lte=moment)
+        .order_by('-valid_from')
+        .values('cost')[:1]
+    )
+
+
+def record_prices(
+    materials: Iterable[Material],
+    valid_from: datetime | None = None,
+    previous_costs: dict[int, Decimal] | None = None,
+) -> int:
+    """
+    Дописывает в историю цен текущую стоимость материалов.
+
+    Запись добавляется только если стоимость отличается от последней записанной,
+    поэтому неизменившиеся цены не занимают места. Для материала без истории
+    (созданного до её ведения) стоимость до изменения из previous_costs
+    записывается с начала истории. Последние цены выбираются одним запросом,
+    новые записи вставляются пакетно. Возвращает число записей.
+    """
+    materials = {material.id: material for material in materials}
+    if not materials:
+        return 0
+
+    valid_from = valid_from or timezone.now()
+    previous_costs = previous_costs or {}
+    latest = dict(
+        Material.objects
+        .filter(id__in=materials)
+        .annotate(latest_cost=price_at(valid_from))
+        .order_by()
+        .values_list('id', 'latest_cost')
+    )
+    prices = []
+    for material_id, material in materials.items():
+        latest_cost = latest.get(material_id)
+        if latest_cost is None and previous_costs.get(material_id) is not None:
+            latest_cost = Decimal(str(previous_costs[material_id]))
+            prices.append(MaterialPrice(material_id=material_id, cost=latest_cost, valid_from=HISTORY_START))
+        if latest_cost is None or latest_cost != Decimal(str(material.cost)):
+            prices.append(MaterialPrice(material_id=material_id, cost=material.cost, valid_from=valid_from))
+    MaterialPrice.objects.bulk_create(prices, batch_size=BATCH_SIZE)
+    return len(prices)
+
+
+def backfill_prices(valid_from: datetime = HISTORY_START) -> int:
+    """
+    Записывает текущую стоимость материалов без истории цен как действующую
+    с valid_from. Повторный запуск ничего не добавляет. Возвращает число записей.
+    """
+    with transaction.atomic():
+        missing = list(
+            Material.objects
+            .filter(~Exists(MaterialPrice.objects.filter(material=OuterRef('pk'))))
+            .order_by('id')
+            .values_list('id', 'cost')
+        )
+        MaterialPrice.objects.bulk_create(
+            [MaterialPrice(material_id=material_id, cost=cost, valid_from=valid_from) for material_id, cost in missing],
+            batch_size=BATCH_SIZE,
+        )
+    return len(missing)
+
+
+def price_history(material_id: int, date_from: datetime | None, date_to: datetime | None) -> QuerySet:
+    """
+    История цен материала за период. Если указано начало периода, первой
+    записью идёт цена, действовавшая на этот момент.
+    """
+    prices = MaterialPrice.objects.filter(material_id=material_id).order_by('valid_from')
+    if date_to is not None:
+        prices = prices.filter(valid_from__lte=date_to)
+    if date_from is not None:
+        in_effect = (
+            MaterialPrice.objects
+            .filter(material_id=material_id, valid_from__lte=date_from)
+            .order_by('-valid_from')
+            .values('id')[:1]
+        )
+        prices = prices.filter(valid_from__gt=date_from) | prices.filter(id__in=Subquery(in_effect))
+    return prices
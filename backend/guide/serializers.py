@@ -1,15 +1,200 @@
+from django.db import router, transaction
+from django.db.models import Q
 from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field
 
-from .models import Category, Material
+from .models import Category, Material, MaterialPrice
+from .prices import record_prices
+from .cache import category_lookup
+
+
+class CategoryLookupField(serializers.PrimaryKeyRelatedField):
+    """
+    Ссылка на категорию по id, проверяемая через кэш поиска категорий,
+    а не отдельным запросом на каждое значение.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+        parents = category_lookup.parents_for_ids([pk])
+        if pk not in parents:
+            self.fail('does_not_exist', pk_value=data)
+        return Category.from_db(router.db_for_read(Category), ['id', 'parent_id'], [pk, parents[pk]])
 
 
 class MaterialSerializer(serializers.ModelSerializer):
     ''' Сериализатор для материалов '''
+    serializer_related_field = CategoryLookupField
+
     class Meta:
         model = Material
         fields = ['id', 'category', 'code', 'name', 'cost']
 
+
+class MaterialAsOfSerializer(serializers.ModelSerializer):
+    ''' Сериализатор материала со стоимостью на заданный момент (аннотация as_of_cost) '''
+    cost = serializers.DecimalField(source='as_of_cost', max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Material
+        fields = ['id', 'category', 'code', 'name', 'cost']
+
+
+class MaterialPriceSerializer(serializers.ModelSerializer):
+    ''' Сериализатор записи истории цен материала '''
+    class Meta:
+        model = MaterialPrice
+        fields = ['cost', 'valid_from']
+
+
+class MaterialBulkItemSerializer(serializers.Serializer):
+    ''' Элемент массового обновления: материал ищется по id или code, остальные поля обновляются '''
+    UPDATE_FIELDS = ('category', 'name', 'cost')
+
+    id = serializers.IntegerField(required=False)
+    code = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(required=False)
+    name = serializers.CharField(required=False, max_length=100)
+    cost = serializers.DecimalField(required=False, max_digits=12, decimal_places=2)
+
+    def validate(self, attrs):
+        if 'id' not in attrs and 'code' not in attrs:
+            raise serializers.ValidationError('Необходимо указать id или code материала.')
+        if not any(field in attrs for field in self.UPDATE_FIELDS):
+            raise serializers.ValidationError('Не указаны поля для обновления.')
+        return attrs
+
+
+class MaterialBulkUpdateSerializer(serializers.Serializer):
+    ''' Массовое частичное обновление материалов одним пакетным UPDATE в транзакции '''
+    MAX_ITEMS = 10000
+    BATCH_SIZE = 1000
+
+    items = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=MAX_ITEMS)
+
+    def save(self) -> list[dict]:
+        """
+        Применяет корректные элементы и возвращает результат по каждому элементу запроса.
+        Некорректные и ненайденные элементы не мешают обновлению остальных.
+        """
+        items = self.validated_data['items']
+        results = [None] * len(items)
+        valid_items = []
+
+        # Один экземпляр сериализатора на все элементы: поля не копируются заново для каждой строки
+        item_serializer = MaterialBulkItemSerializer()
+        for index, item in enumerate(items):
+            try:
+                valid_items.append((index, item_serializer.run_validation(item)))
+            except serializers.ValidationError as exc:
+                results[index] = {'index': index, 'status': 'invalid', 'errors': exc.detail}
+
+        ids = {data['id'] for _, data in valid_items if 'id' in data}
+        codes = {data['code'] for _, data in valid_items if 'id' not in data}
+        category_ids = {data['category'] for _, data in valid_items if 'category' in data}
+
+        with transaction.atomic():
+            materials = (
+                Material.objects
+                .select_for_update()
+                .filter(Q(id__in=ids) | Q(code__in=codes))
+                .only('id', 'code', 'category_id', 'name', 'cost')
+                # Строки блокируются в порядке id, чтобы встречные массовые обновления не взаимоблокировались
+                .order_by('id')
+            )
+            materials_by_id = {material.id: material for material in materials}
+            materials_by_code = {material.code: material for material in materials_by_id.values()}
+            existing_category_ids = category_lookup.parents_for_ids(category_ids).keys()
+
+            # Материалы группируются по набору обновляемых полей, чтобы UPDATE
+            # не переписывал неизменённые столбцы (например, при переоценке - только cost)
+            changed = {}
+            previous_costs = {}
+            for index, data in valid_items:
+                if 'id' in data:
+                    material = materials_by_id.get(data['id'])
+                else:
+                    material = materials_by_code.get(data['code'])
+
+                if material is None:
+                    results[index] = {'index': index, 'status': 'not_found'}
+                    continue
+                if 'category' in data and data['category'] not in existing_category_ids:
+                    results[index] = {
+                        'index': index,
+                        'status': 'invalid',
+                        'errors': {'category': [f'Категория {data["category"]} не существует.']},
+                    }
+                    continue
+
+                fields = tuple(field for field in MaterialBulkItemSerializer.UPDATE_FIELDS if field in data)
+                previous_costs.setdefault(material.id, material.cost)
+                for field in fields:
+                    setattr(material, 'category_id' if field == 'category' else field, data[field])
+                changed.setdefault(fields, {})[material.id] = material
+                results[index] = {'index': index, 'id': material.id, 'status': 'updated'}
+
+            repriced = []
+            for fields, group in changed.items():
+                Material.objects.bulk_update(group.values(), fields, batch_size=self.BATCH_SIZE)
+                if 'cost' in fields:
+                    repriced.extend(group.values())
+            record_prices(repriced, previous_costs=previous_costs)
+
+        return results
+
+
+class MaterialBulkDeleteSerializer(serializers.Serializer):
+    """
+    Массовое удаление материалов по списку id и/или code в транзакции.
+
+    Как и при удалении поддерева категорий, каскадное удаление Django не
+    используется: история цен и материалы удаляются двумя запросами DELETE
+    без загрузки объектов в Python.
+    """
+    MAX_ITEMS = 10000
+
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, max_length=MAX_ITEMS)
+    codes = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, max_length=MAX_ITEMS)
+
+    def validate(self, attrs):
+        if not attrs['ids'] and not attrs['codes']:
+            raise serializers.ValidationError('Необходимо указать ids или codes материалов.')
+        return attrs
+
+    def save(self) -> list[dict]:
+        ''' Удаляет найденные материалы и возвращает результат по каждому id и code запроса '''
+        ids = self.validated_data['ids']
+        codes = self.validated_data['codes']
+
+        using = router.db_for_write(Material)
+        with transaction.atomic(using=using):
+            found = list(
+                Material.objects.using(using)
+                .select_for_update()
+                .filter(Q(id__in=ids) | Q(code__in=codes))
+                .order_by('id')
+                .values_list('id', 'code')
+            )
+            found_ids = {material_id for material_id, _ in found}
+            if found_ids:
+                MaterialPrice.objects.using(using).filter(material_id__in=found_ids)._raw_delete(using)
+                Material.objects.using(using).filter(id__in=found_ids)._raw_delete(using)
+
+        found_codes = {code for _, code in found}
+        return [
+            {'id': material_id, 'status': 'deleted' if material_id in found_ids else 'not_found'}
+            for material_id in ids
+        ] + [
+            {'code': code, 'status': 'deleted' if code in found_codes else 'not_found'}
+            for code in codes
+        ]
+
 class CategorySerializer(serializers.ModelSerializer):
     materials = MaterialSerializer(many=True, read_only=True)
     
@@ -17,6 +202,135 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'parent', 'code', 'name', 'materials']
 
+class CategoryMoveSerializer(serializers.Serializer):
+    ''' Перенос категории с поддеревом под другого родителя (null - в корень) '''
+    parent = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), allow_null=True)
+
+class CategoryImportRowSerializer(serializers.Serializer):
+    ''' Строка импорта категорий: родитель задаётся кодом категории '''
+    code = serializers.IntegerField(min_value=0, max_value=32767)
+    name = serializers.CharField(max_length=55)
+    parent = serializers.IntegerField(required=False, allow_null=True)
+
+class CategoryImportSerializer(serializers.Serializer):
+    """
+    Предварительно проверенный импорт категорий.
+
+    Родители разрешаются по кодам в памяти (родитель может идти в листе после
+    дочерних категорий или уже существовать в базе), категории упорядочиваются
+    по уровням дерева и вставляются пакетно, по одному bulk_create на уровень.
+    При любой ошибке ничего не сохраняется, ошибки возвращаются по номерам строк листа.
+    """
+    MAX_ROWS = 50000
+    BATCH_SIZE = 1000
+    FIRST_ROW = 2
+
+    rows = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=MAX_ROWS)
+
+    def validate(self, attrs):
+        errors = {}
+        rows = {}
+
+        row_serializer = CategoryImportRowSerializer()
+        for index, row in enumerate(attrs['rows']):
+            number = index + self.FIRST_ROW
+            try:
+                data = row_serializer.run_validation(row)
+            except serializers.ValidationError as exc:
+                errors[number] = exc.detail
+                continue
+            if data['code'] in rows:
+                errors[number] = {'code': [f'Код {data["code"]} повторяется в файле.']}
+                continue
+            rows[data['code']] = (number, data)
+
+        parent_codes = {data['parent'] for _, data in rows.values() if data.get('parent') is not None}
+        existing = category_lookup.ids_for_codes(rows.keys() | parent_codes)
+        for code, (number, data) in rows.items():
+            parent = data.get('parent')
+            if code in existing:
+                errors[number] = {'code': [f'Категория с кодом {code} уже существует.']}
+            elif parent is not None and parent not in rows and parent not in existing:
+                errors[number] = {'parent': [f'Категория с кодом {parent} не найдена.']}
+
+        # Циклы ищутся и при ошибках в других строках, чтобы все ошибки файла вернулись сразу.
+        # Строки с ошибками считаются корнями, иначе их потомки ошибочно попали бы в циклы.
+        invalid = {code for code, (number, _) in rows.items() if number in errors}
+        attrs['levels'] = self.order_levels(rows, existing, roots=invalid)
+        placed = {code for level in attrs['levels'] for code in level}
+        for code, (number, _) in rows.items():
+            if code not in placed:
+                errors[number] = {'parent': ['Циклическая ссылка на родительскую категорию.']}
+
+        if errors:
+            raise serializers.ValidationError({'errors': dict(sorted(errors.items()))})
+
+        attrs['rows'] = {code: data for code, (_, data) in rows.items()}
+        attrs['existing'] = existing
+        return attrs
+
+    @staticmethod
+    def order_levels(rows: dict, existing: dict, roots: set[int] = frozenset()) -> list[list[int]]:
+        ''' Коды категорий по уровням: сначала те, чей родитель уже есть в базе или отсутствует, и roots '''
+        children = {}
+        level = []
+        for code, (_, data) in rows.items():
+            parent = data.get('parent')
+            if parent is None or parent in existing or code in roots:
+                level.append(code)
+            else:
+                children.setdefault(parent, []).append(code)
+
+        levels = []
+        while level:
+            levels.append(level)
+            level = [child for code in level for child in children.get(code, [])]
+        return levels
+
+    def save(self) -> int:
+        ''' Создаёт категории уровень за уровнем, возвращает количество созданных '''
+        rows = self.validated_data['rows']
+        ids = dict(self.validated_data['existing'])
+
+        with transaction.atomic():
+            for level in self.validated_data['levels']:
+                created = Category.objects.bulk_create(
+                    [
+                        Category(
+                            code=code,
+                            name=rows[code]['name'],
+                            parent_id=ids.get(rows[code].get('parent')),
+                        )
+                        for code in level
+                    ],
+                    batch_size=self.BATCH_SIZE,
+                )
+                ids.update((category.code, category.id) for category in created)
+        return len(rows)
+
+class CategoryCompactSerializer(serializers.ModelSerializer):
+    ''' Сериализатор категории без материалов '''
+    class Meta:
+        model = Category
+        fields = ['id', 'parent', 'code', 'name']
+
+class CategoryMaterialsCountSerializer(serializers.ModelSerializer):
+    ''' Сериализатор категории с количеством материалов (аннотация materials_count) '''
+    materials_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ['id', 'parent', 'code', 'name', 'materials_count']
+
+class CategoryMaterialsPageSerializer(serializers.ModelSerializer):
+    ''' Сериализатор категории с первой страницей материалов (атрибут materials_page) '''
+    materials_count = serializers.IntegerField(read_only=True)
+    materials = MaterialSerializer(source='materials_page', many=True, read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ['id', 'parent', 'code', 'name', 'materials_count', 'materials']
+
 class CategoryTreeSerializer(serializers.ModelSerializer):
     materials = MaterialSerializer(many=True, read_only=True)
     children = serializers.SerializerMethodField(read_only=True)
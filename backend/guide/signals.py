@@ -0,0 +1,21 @@
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import category_lookup
+from .models import Category
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_lookup(sender, using, **kwargs):
+    """
+    Сброс кэша поиска категорий при изменении категории: локально сразу,
+    для остальных воркеров - после фиксации транзакции.
+    """
+    category_lookup.clear()
+    transaction.on_commit(category_lookup.invalidate, using=using)
+
+
+request_started.connect(category_lookup.mark_stale, dispatch_uid='guide.category_lookup.mark_stale')
@@ -1,5 +1,8 @@
 import json
+from io import BytesIO
 
+from openpyxl import Workbook
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -47,6 +50,50 @@ class CategoryViewSetTestCase(TestCase):
         self.assertIn('materials', data[0])
         self.assertEqual(len(data[0]['materials']), 1) 
 
+    def test_flat_list_without_materials(self):
+        """Тест эндпоинта /categories/?materials=none"""
+        url = reverse('category-list')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'materials': 'none'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        data = response.json()
+        self.assertEqual(len(data), 3)
+        self.assertNotIn('materials', data[0])
+
+    def test_flat_list_with_materials_count(self):
+        """Тест эндпоинта /categories/?materials=count"""
+        Material.objects.create(category=self.root_category, code=1004, name="Сталь", cost=100.00)
+        url = reverse('category-list')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'materials': 'count'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        counts = {category['id']: category['materials_count'] for category in response.json()}
+        self.assertEqual(counts[self.root_category.id], 2)
+        self.assertEqual(counts[self.grandchild_category.id], 1)
+
+    def test_retrieve_with_materials_page(self):
+        """Тест эндпоинта /categories/<id>/?materials=page с ограничением страницы материалов."""
+        Material.objects.bulk_create([
+            Material(category=self.root_category, code=2000 + i, name=f"Материал {i}", cost=1)
+            for i in range(25)
+        ])
+        url = reverse('category-detail', args=[self.root_category.id])
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'materials': 'page'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        data = response.json()
+        self.assertEqual(data['materials_count'], 26)
+        self.assertEqual(len(data['materials']), 20)
+
+    def test_flat_list_with_invalid_materials_mode(self):
+        """Тест эндпоинта /categories/ с неизвестным режимом материалов."""
+        response = self.client.get(reverse('category-list'), {'materials': 'unknown'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('materials', response.json())
+
     @log_db_queries
     def test_tree_view(self):
         """Тест эндпоинта /categories/tree/ для получения иерархического дерева."""
@@ -108,6 +155,69 @@ class CategoryViewSetTestCase(TestCase):
         with self.assertRaises(Category.DoesNotExist):
             Category.objects.get(id=self.grandchild_category.id)
 
+    def test_delete_category_subtree(self):
+        """Тест удаления категории вместе с дочерними категориями и материалами."""
+        Category.objects.create(name="Пластмассы", code="0004")
+        url = reverse('category-detail', args=[self.root_category.id])
+        with self.assertNumQueries(6):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ["Пластмассы"])
+        self.assertFalse(Material.objects.exists())
+
+    def test_delete_missing_category(self):
+        """Тест удаления несуществующей категории."""
+        url = reverse('category-detail', args=[999999])
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_move_category(self):
+        """Тест переноса категории с поддеревом в корень."""
+        url = reverse('category-move', args=[self.child_category.id])
+        response = self.client.post(url, {'parent': None}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.json()['parent'])
+
+        self.child_category.refresh_from_db()
+        self.grandchild_category.refresh_from_db()
+        self.assertIsNone(self.child_category.parent)
+        self.assertEqual(self.grandchild_category.parent, self.child_category)
+
+    def test_move_category_into_own_subtree(self):
+        """Тест запрета переноса категории в собственное поддерево."""
+        url = reverse('category-move', args=[self.root_category.id])
+        response = self.client.post(url, {'parent': self.grandchild_category.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('parent', response.json())
+
+        self.root_category.refresh_from_db()
+        self.assertIsNone(self.root_category.parent)
+
+    def test_update_category_parent_cycle(self):
+        """Тест запрета цикла при обновлении родителя через PATCH."""
+        url = reverse('category-detail', args=[self.child_category.id])
+        response = self.client.patch(url, {'parent': self.grandchild_category.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('parent', response.json())
+
+        response = self.client.patch(url, {'parent': self.child_category.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.child_category.refresh_from_db()
+        self.assertEqual(self.child_category.parent, self.root_category)
+
+    def test_update_category_parent_moves_subtree(self):
+        """Тест смены родителя через PATCH вместе с другими полями."""
+        url = reverse('category-detail', args=[self.grandchild_category.id])
+        response = self.client.patch(url, {'parent': None, 'name': 'Алюминий (корень)'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.json()['parent'])
+
+        self.grandchild_category.refresh_from_db()
+        self.assertIsNone(self.grandchild_category.parent)
+        self.assertEqual(self.grandchild_category.name, 'Алюминий (корень)')
+
     def test_create_category_with_duplicate_code(self):
         """Тест на создание категории с дублирующимся кодом."""
         url = reverse('category-list')
@@ -131,3 +241,67 @@ class CategoryViewSetTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('name', response.json())
         self.assertIn('code', response.json())
+
+
+class CategoryExcelImportTestCase(TestCase):
+    """Тесты импорта категорий из Excel файла."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('category-import-categories')
+        self.existing = Category.objects.create(name="Металлы", code=1)
+
+    def upload(self, rows):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['Code', 'Name', 'Parent'])
+        for row in rows:
+            sheet.append(row)
+
+        excel_file = BytesIO()
+        workbook.save(excel_file)
+        uploaded_file = SimpleUploadedFile('categories.xlsx', excel_file.getvalue())
+        return self.client.post(self.url, {'file': uploaded_file}, format='multipart')
+
+    def test_import_with_parents_after_children(self):
+        """Тест импорта, где дочерние категории идут в файле раньше родителей."""
+        with self.assertNumQueries(5):
+            response = self.upload([
+                [4, 'Алюминий', 3],
+                [3, 'Цветные металлы', 1],
+                [5, 'Пластмассы', None],
+                [6, 'Полиэтилен', 5],
+            ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['created'], 4)
+
+        aluminium = Category.objects.select_related('parent__parent').get(code=4)
+        self.assertEqual(aluminium.parent.code, 3)
+        self.assertEqual(aluminium.parent.parent, self.existing)
+        self.assertIsNone(Category.objects.get(code=5).parent)
+        self.assertEqual(Category.objects.get(code=6).parent.code, 5)
+
+    def test_import_is_rejected_as_a_whole(self):
+        """Тест отказа в импорте всего файла при ошибках в строках."""
+        response = self.upload([
+            [3, 'Цветные металлы', 1],
+            [1, 'Дубликат существующей', None],
+            [7, 'Без родителя', 999],
+            [8, 'Цикл', 9],
+            [9, 'Цикл', 8],
+            [10, 'Потомок строки с ошибкой', 7],
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.json()['errors']), ['3', '4', '5', '6'])
+        self.assertEqual(Category.objects.count(), 1)
+
+    def test_import_detects_cycles(self):
+        """Тест обнаружения циклических ссылок между строками файла."""
+        response = self.upload([
+            [8, 'Цикл', 9],
+            [9, 'Цикл', 8],
+            [10, 'Корень', None],
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.json()['errors']), ['2', '3'])
+        self.assertEqual(Category.objects.count(), 1)
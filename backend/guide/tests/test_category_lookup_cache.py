@@ -0,0 +1,109 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from guide.cache import CategoryLookupCache, category_lookup
+from guide.models import Category
+from guide.serializers import MaterialSerializer
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CategoryLookupCacheTestCase(TestCase):
+    """Тесты кэша разрешения категорий по коду и id."""
+
+    def setUp(self):
+        self.root = Category.objects.create(code=1, name="Металлы")
+        self.child = Category.objects.create(code=2, name="Цветные металлы", parent=self.root)
+        self.cache = CategoryLookupCache(maxsize=10, recheck_seconds=60)
+
+    def test_lookups_are_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.ids_for_codes([1, 2, 999]), {1: self.root.id, 2: self.child.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.ids_for_codes([1, 2]), {1: self.root.id, 2: self.child.id})
+            self.assertEqual(
+                self.cache.parents_for_ids([self.root.id, self.child.id]),
+                {self.root.id: None, self.child.id: self.root.id},
+            )
+        self.assertEqual(self.cache.stats()['hits'], 4)
+        self.assertEqual(self.cache.stats()['misses'], 3)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.maxsize = 1
+        self.cache.ids_for_codes([1])
+        self.cache.ids_for_codes([2])
+        self.assertEqual(list(self.cache.code_to_id), [2])
+
+    def test_version_change_clears_other_processes(self):
+        other = CategoryLookupCache(maxsize=10, recheck_seconds=60)
+        self.cache.ids_for_codes([1])
+        other.invalidate()
+
+        self.cache.mark_stale()
+        with self.assertNumQueries(1):
+            self.cache.ids_for_codes([1])
+
+    def test_version_is_rechecked_outside_requests(self):
+        other = CategoryLookupCache(maxsize=10, recheck_seconds=60)
+        self.cache.ids_for_codes([1])
+        other.invalidate()
+
+        with self.assertNumQueries(0):
+            self.cache.ids_for_codes([1])
+        self.cache.checked_at -= 60
+        with self.assertNumQueries(1):
+            self.cache.ids_for_codes([1])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'missing_cache_table',
+    }})
+    def test_cache_backend_error_does_not_break_lookups(self):
+        self.cache.ids_for_codes([1])
+        self.cache.mark_stale()
+        with self.assertLogs('guide.cache', 'WARNING'):
+            self.assertEqual(self.cache.ids_for_codes([1]), {1: self.root.id})
+        self.assertEqual(Category.objects.count(), 2)
+
+    def test_category_save_clears_cache(self):
+        category_lookup.parents_for_ids([self.child.id])
+        self.child.parent = None
+        self.child.save()
+        self.assertEqual(category_lookup.parents_for_ids([self.child.id]), {self.child.id: None})
+
+    def test_material_rows_are_validated_without_per_row_category_queries(self):
+        rows = [
+            {'category': self.root.id if i % 2 else self.child.id, 'code': i, 'name': f'Material {i}', 'cost': '1.00'}
+            for i in range(20)
+        ]
+        serializer = MaterialSerializer(data=rows, many=True)
+        with CaptureQueriesContext(connection) as queries:
+            category_lookup.parents_for_ids([self.root.id, self.child.id])
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            self.assertFalse(MaterialSerializer(data={**rows[0], 'category': 999999}).is_valid())
+
+        category_queries = [query for query in queries if 'guide_category' in query['sql']]
+        self.assertEqual(len(category_queries), 2)
+
+
+class CategoryLookupCacheStatsTestCase(TestCase):
+    """Тесты эндпоинта статистики кэша."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('category-lookup-cache')
+
+    def test_stats_require_admin(self):
+        response = self.client.get(self.url)
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+    def test_stats_for_admin(self):
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('hits', response.json())
+        self.assertIn('misses', response.json())
@@ -0,0 +1,111 @@
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+
+from core.middleware import ReplicaStickinessMiddleware
+from core.routers import (
+    PrimaryReplicaRouter,
+    pin_reads_to,
+    pinned_read_alias,
+    reset_read_pin,
+)
+from guide.models import Category, Material
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], DB_REPLICA_STICKY_SECONDS=5)
+class PrimaryReplicaRouterTestCase(SimpleTestCase):
+    """Тесты маршрутизации чтения в реплики и записи в основную базу."""
+    # Тесты выполняются вне транзакции TestCase; база нужна только для transaction.atomic()
+    databases = {'default'}
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_guide_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Category), 'replica_0')
+        self.assertEqual(self.router.db_for_read(Material), 'replica_0')
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Material), 'default')
+
+    def test_other_apps_are_not_routed(self):
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_pinned_reads_go_to_primary(self):
+        token = pin_reads_to('default')
+        try:
+            self.assertEqual(self.router.db_for_read(Material), 'default')
+        finally:
+            reset_read_pin(token)
+
+    @override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+    def test_reads_of_one_request_use_one_replica(self):
+        token = pin_reads_to('replica_1')
+        try:
+            for _ in range(10):
+                self.assertEqual(self.router.db_for_read(Category), 'replica_1')
+                self.assertEqual(self.router.db_for_read(Material), 'replica_1')
+        finally:
+            reset_read_pin(token)
+
+    @override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+    def test_related_reads_follow_instance_database(self):
+        category = Category(code=1, name='Категория')
+        category._state.db = 'replica_1'
+        token = pin_reads_to('replica_0')
+        try:
+            self.assertEqual(self.router.db_for_read(Material, instance=category), 'replica_1')
+        finally:
+            reset_read_pin(token)
+
+    def test_reads_inside_primary_transaction_go_to_primary(self):
+        token = pin_reads_to('replica_0')
+        try:
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(Material), 'default')
+            self.assertEqual(self.router.db_for_read(Material), 'replica_0')
+        finally:
+            reset_read_pin(token)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_reads_go_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Material), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica_0', 'guide'))
+        self.assertTrue(self.router.allow_migrate('default', 'guide'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], DB_REPLICA_STICKY_SECONDS=5)
+class ReplicaStickinessMiddlewareTestCase(TestCase):
+    """Тесты привязки клиента к основной базе после записи."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.read_alias = None
+
+        def get_response(request):
+            self.read_alias = pinned_read_alias()
+            return HttpResponse()
+
+        self.middleware = ReplicaStickinessMiddleware(get_response)
+
+    def test_write_is_pinned_and_sets_cookie(self):
+        before = pinned_read_alias()
+        response = self.middleware(self.factory.post('/materials/'))
+        self.assertEqual(self.read_alias, 'default')
+        self.assertIn(ReplicaStickinessMiddleware.COOKIE_NAME, response.cookies)
+        self.assertEqual(response.cookies[ReplicaStickinessMiddleware.COOKIE_NAME]['max-age'], 5)
+        self.assertEqual(pinned_read_alias(), before)
+
+    def test_read_after_write_is_pinned(self):
+        request = self.factory.get('/materials/')
+        request.COOKIES[ReplicaStickinessMiddleware.COOKIE_NAME] = '1'
+        response = self.middleware(request)
+        self.assertEqual(self.read_alias, 'default')
+        self.assertNotIn(ReplicaStickinessMiddleware.COOKIE_NAME, response.cookies)
+
+    def test_plain_read_uses_one_replica(self):
+        self.middleware(self.factory.get('/materials/'))
+        self.assertEqual(self.read_alias, 'replica_0')
@@ -1,13 +1,17 @@
-from io import BytesIO
+from datetime import datetime, timedelta, timezone as dt_timezone
+from hashlib import sha256
+from decimal import Decimal
+from io import BytesIO, StringIO
 
 from openpyxl import Workbook
+from django.core.management import call_command
 from django.test import TestCase, Client
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from guide.models import Material, Category
+from guide.models import Material, Category, MaterialImport, MaterialPrice
 
 class MaterialAPITestCase(TestCase):
     def setUp(self):
@@ -154,4 +158,146 @@ class MaterialExcelUploadTest(TestCase):
 
         material4 = Material.objects.get(code=302)
         self.assertEqual(material4.name, 'Material D')
-        self.assertEqual(material4.cost, 35.5)
\ No newline at end of file
+        self.assertEqual(material4.cost, 35.5)
+
+    def test_reupload_same_file_returns_stored_result(self):
+        content = self.create_excel_file([
+            [1, 401, 'Material 1', 10.5],
+            [2, 402, 'Material 2', 15.75]
+        ]).read()
+
+        response = self.client.post(self.url, {'files': [SimpleUploadedFile('first.xlsx', content)]})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['imports'][0]['status'], 'imported')
+
+        response = self.client.post(self.url, {'files': [SimpleUploadedFile('retry.xlsx', content)]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        summary = response.json()['imports'][0]
+        self.assertEqual(summary['status'], 'duplicate')
+        self.assertEqual(summary['created'], 2)
+        self.assertEqual(summary['filename'], 'first.xlsx')
+        self.assertEqual(Material.objects.count(), 2)
+        self.assertEqual(MaterialImport.objects.count(), 1)
+
+    def test_reupload_same_file_with_force_imports_again(self):
+        content = self.create_excel_file([[1, 501, 'Material 1', 10.5]]).read()
+
+        response = self.client.post(self.url, {'files': [SimpleUploadedFile('first.xlsx', content)]})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        Material.objects.all().delete()
+        response = self.client.post(self.url, {'files': [SimpleUploadedFile('first.xlsx', content)], 'force': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['imports'][0]['status'], 'imported')
+        self.assertEqual(Material.objects.count(), 1)
+
+
+    def test_reupload_while_import_in_progress_returns_conflict(self):
+        content = self.create_excel_file([[1, 601, 'Material 1', 10.5]]).read()
+        MaterialImport.objects.create(content_hash=sha256(content).hexdigest(), filename='first.xlsx')
+
+        response = self.client.post(self.url, {'files': [SimpleUploadedFile('retry.xlsx', content)]})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()['in_progress'], ['retry.xlsx'])
+        self.assertEqual(Material.objects.count(), 0)
+        self.assertEqual(MaterialImport.objects.get().status, MaterialImport.Status.RUNNING)
+
+    def test_stale_import_claim_is_taken_over(self):
+        content = self.create_excel_file([[1, 701, 'Material 1', 10.5]]).read()
+        claim = MaterialImport.objects.create(content_hash=sha256(content).hexdigest(), filename='first.xlsx')
+        MaterialImport.objects.filter(pk=claim.pk).update(claimed_at=claim.claimed_at - timedelta(hours=1))
+
+        response = self.client.post(self.url, {'files': [SimpleUploadedFile('retry.xlsx', content)]})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['imports'][0]['status'], 'imported')
+        self.assertEqual(MaterialImport.objects.get().status, MaterialImport.Status.COMPLETED)
+
+    def test_failed_import_releases_claim(self):
+        content = self.create_excel_file([[999, 801, 'Material 1', 10.5]]).read()
+
+        response = self.client.post(self.url, {'files': [SimpleUploadedFile('first.xlsx', content)]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(MaterialImport.objects.exists())
+
+
+class MaterialPriceHistoryTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(code=1111, name="Test Category")
+
+        response = self.client.post(reverse('material-list'), {
+            'category': self.category.id, 'code': 1001, 'name': 'Material', 'cost': '100.00',
+        }, format='json')
+        self.material = Material.objects.get(id=response.data['id'])
+        self.detail_url = reverse('material-detail', args=[self.material.id])
+        self.prices_url = reverse('material-prices', args=[self.material.id])
+
+    def set_price_dates(self, *dates):
+        for price, date in zip(MaterialPrice.objects.order_by('id'), dates):
+            price.valid_from = date
+            price.save()
+
+    def test_only_changes_are_recorded(self):
+        self.client.patch(self.detail_url, {'cost': '120.00'}, format='json')
+        self.client.patch(self.detail_url, {'cost': '120.00'}, format='json')
+        self.client.patch(self.detail_url, {'name': 'Renamed'}, format='json')
+
+        self.assertEqual(
+            list(MaterialPrice.objects.order_by('id').values_list('cost', flat=True)),
+            [Decimal('100.00'), Decimal('120.00')],
+        )
+
+    def test_price_history_range(self):
+        self.client.patch(self.detail_url, {'cost': '120.00'}, format='json')
+        self.client.patch(self.detail_url, {'cost': '140.00'}, format='json')
+        self.set_price_dates(
+            datetime(2024, 1, 1, tzinfo=dt_timezone.utc),
+            datetime(2024, 2, 1, tzinfo=dt_timezone.utc),
+            datetime(2024, 3, 1, tzinfo=dt_timezone.utc),
+        )
+
+        response = self.client.get(self.prices_url, {'from': '2024-01-15', 'to': '2024-02-15'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([price['cost'] for price in response.data], ['100.00', '120.00'])
+
+        response = self.client.get(self.prices_url)
+        self.assertEqual(len(response.data), 3)
+
+    def test_price_history_invalid_date(self):
+        response = self.client.get(self.prices_url, {'from': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_materials_as_of(self):
+        self.client.patch(self.detail_url, {'cost': '120.00'}, format='json')
+        self.set_price_dates(
+            datetime(2024, 1, 1, tzinfo=dt_timezone.utc),
+            datetime(2024, 2, 1, tzinfo=dt_timezone.utc),
+        )
+
+        response = self.client.get(reverse('material-list'), {'as_of': '2024-01-20'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['cost'], '100.00')
+
+        response = self.client.get(reverse('material-list'), {'as_of': '2023-12-01'})
+        self.assertEqual(response.data, [])
+
+    def test_reprice_without_history_seeds_previous_cost(self):
+        material = Material.objects.create(category=self.category, code=2001, name='Legacy', cost='100.00')
+
+        self.client.patch(reverse('material-detail', args=[material.id]), {'cost': '150.00'}, format='json')
+
+        self.assertEqual(
+            list(material.prices.order_by('valid_from').values_list('cost', flat=True)),
+            [Decimal('100.00'), Decimal('150.00')],
+        )
+
+    def test_backfill_prices_for_materials_without_history(self):
+        material = Material.objects.create(category=self.category, code=2002, name='Legacy', cost='80.00')
+
+        call_command('backfill_material_prices', stdout=StringIO())
+        call_command('backfill_material_prices', stdout=StringIO())
+
+        self.assertEqual(list(material.prices.values_list('cost', flat=True)), [Decimal('80.00')])
+        self.assertEqual(MaterialPrice.objects.filter(material=self.material).count(), 1)
+        response = self.client.get(reverse('material-list'), {'as_of': '2099-01-01'})
+        self.assertEqual({item['code'] for item in response.data}, {1001, 2002})
@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from guide.models import Material, Category, MaterialPrice
+
+
+class MaterialBulkAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('material-bulk')
+
+        self.category = Category.objects.create(code=1111, name="Test Category")
+        self.other_category = Category.objects.create(code=2222, name="Other Category")
+
+        self.material_1 = Material.objects.create(category=self.category, code=1001, name="Material 1", cost=10)
+        self.material_2 = Material.objects.create(category=self.category, code=1002, name="Material 2", cost=20)
+        self.material_3 = Material.objects.create(category=self.category, code=1003, name="Material 3", cost=30)
+
+    def test_bulk_update_by_id_and_code(self):
+        data = {'items': [
+            {'id': self.material_1.id, 'cost': '11.50'},
+            {'code': 1002, 'name': 'Renamed', 'category': self.other_category.id},
+        ]}
+        with self.assertNumQueries(8):
+            response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 2)
+
+        self.material_1.refresh_from_db()
+        self.material_2.refresh_from_db()
+        self.material_3.refresh_from_db()
+        self.assertEqual(self.material_1.cost, Decimal('11.50'))
+        self.assertEqual(self.material_1.name, 'Material 1')
+        self.assertEqual(self.material_2.name, 'Renamed')
+        self.assertEqual(self.material_2.category, self.other_category)
+        self.assertEqual(self.material_3.cost, Decimal('30.00'))
+        self.assertEqual(
+            list(self.material_1.prices.order_by('valid_from').values_list('cost', flat=True)),
+            [Decimal('10.00'), Decimal('11.50')],
+        )
+
+    def test_bulk_update_reports_per_item_errors(self):
+        data = {'items': [
+            {'id': self.material_1.id, 'cost': '99.00'},
+            {'id': 999999, 'cost': '1.00'},
+            {'cost': '1.00'},
+            {'id': self.material_2.id, 'category': 999999},
+        ]}
+        response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['updated', 'not_found', 'invalid', 'invalid'],
+        )
+
+        self.material_2.refresh_from_db()
+        self.assertEqual(self.material_2.category, self.category)
+
+    def test_bulk_update_requires_items(self):
+        response = self.client.patch(self.url, {'items': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_delete(self):
+        MaterialPrice.objects.create(material=self.material_1, cost=10)
+        data = {'ids': [self.material_1.id, 999999], 'codes': [1002]}
+        # SAVEPOINT, SELECT ... FOR UPDATE, DELETE истории цен, DELETE материалов, RELEASE SAVEPOINT
+        with self.assertNumQueries(5):
+            response = self.client.delete(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted'], 2)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['deleted', 'not_found', 'deleted'],
+        )
+        self.assertEqual(list(Material.objects.values_list('code', flat=True)), [1003])
+        self.assertFalse(MaterialPrice.objects.exists())
+
+    def test_bulk_delete_requires_ids_or_codes(self):
+        response = self.client.delete(self.url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,56 @@
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from guide.models import Category
+
+
+class RequestProfilingTestCase(TestCase):
+    """Тесты профилирования отдельных запросов."""
+
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        Category.objects.create(code=1, name="Металлы")
+        self.url = reverse('category-tree')
+
+    def get(self, client=None, **extra):
+        with override_settings(PROFILING_ENABLED=True, PROFILING_SECRET='secret', PROFILING_DIR=self.profile_dir.name):
+            return (client or APIClient()).get(self.url, **extra)
+
+    def saved_files(self):
+        return sorted(path.suffix for path in Path(self.profile_dir.name).iterdir())
+
+    def test_profile_with_secret(self):
+        response = self.get(HTTP_X_PROFILE='1', HTTP_X_PROFILE_TOKEN='secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('X-Profile-Id', response)
+        self.assertEqual(self.saved_files(), ['.prof', '.txt'])
+
+        report = Path(self.profile_dir.name, f"{response['X-Profile-Id']}.txt").read_text(encoding='utf-8')
+        self.assertIn('Запросов к БД', report)
+        self.assertRegex(report, r'\n  default: [1-9]\d* запросов')
+        self.assertIn('Наибольшие выделения памяти', report)
+
+    def test_profile_for_staff_with_query_flag(self):
+        client = APIClient()
+        client.force_login(User.objects.create_user('staff', password='staff', is_staff=True))
+        response = self.get(client, data={'profile': '1'})
+        self.assertIn('X-Profile-Id', response)
+
+    def test_profile_requires_permission(self):
+        response = self.get(HTTP_X_PROFILE='1', HTTP_X_PROFILE_TOKEN='wrong')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.saved_files(), [])
+
+    def test_profile_disabled(self):
+        with override_settings(PROFILING_ENABLED=False, PROFILING_SECRET='secret', PROFILING_DIR=self.profile_dir.name):
+            response = APIClient().get(self.url, HTTP_X_PROFILE='1', HTTP_X_PROFILE_TOKEN='secret')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.saved_files(), [])
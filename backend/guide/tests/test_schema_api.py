@@ -0,0 +1,43 @@
+import tempfile
+from pathlib import Path
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+
+class PrecomputedSchemaTestCase(TestCase):
+    """Тесты отдачи заранее сгенерированной OpenAPI схемы."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('schema')
+        self.schema_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.schema_dir.cleanup)
+
+    def test_serves_precomputed_schema_with_cache_headers(self):
+        Path(self.schema_dir.name, 'schema.yaml').write_text('openapi: 3.0.3\n')
+        with override_settings(SPECTACULAR_SCHEMA_DIR=self.schema_dir.name):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, b'openapi: 3.0.3\n')
+            self.assertIn('max-age', response['Cache-Control'])
+
+            etag = response['ETag']
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], etag)
+
+            for header in (f'"other", W/{etag}', '*'):
+                response = self.client.get(self.url, HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"x{etag[1:]}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_generates_schema_without_precomputed_file(self):
+        with override_settings(SPECTACULAR_SCHEMA_DIR=self.schema_dir.name):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'/materials/', response.content)
@@ -4,6 +4,8 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     MaterialListView,
     MaterialDetailView,
+    MaterialBulkView,
+    MaterialPriceHistoryView,
     CategoryViewSet,
 )
 
@@ -13,5 +15,7 @@ router.register(r'categories', CategoryViewSet, basename='category')
 urlpatterns = [
     path('', include(router.urls)),
     path('materials/', MaterialListView.as_view(), name='material-list'),
+    path('materials/bulk/', MaterialBulkView.as_view(), name='material-bulk'),
     path('materials/<int:id>/', MaterialDetailView.as_view(), name='material-detail'),
+    path('materials/<int:id>/prices/', MaterialPriceHistoryView.as_view(), name='material-prices'),
 ]
\ No newline at end of file
@@ -1,5 +1,40 @@
-import openpyxl
+import hashlib
+from datetime import datetime, time
+
 from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def file_sha256(file: UploadedFile) -> str:
+    ''' Потоковый SHA-256 загруженного файла; после чтения файл перематывается в начало '''
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def parse_moment(value: str, end_of_day: bool = False) -> datetime | None:
+    """
+    Разбирает дату или дату-время ISO 8601 из параметра запроса.
+    Дата без времени означает начало дня, либо его конец при end_of_day.
+    Время без часового пояса считается в текущем часовом поясе.
+    Возвращает None, если значение не удалось разобрать.
+    """
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            moment = datetime.combine(day, time.max if end_of_day else time.min)
+    except ValueError:
+        return None
+
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
 
 
 class ExcelParser:
@@ -13,16 +48,38 @@ class ExcelParser:
         self.file = file
 
     def parse(self, from_row: int) -> list[dict]: 
+        # openpyxl импортируется лениво: загрузка модуля заметно замедляет старт воркеров,
+        # а нужен он только при импорте файлов
+        import openpyxl
+
         workbook = openpyxl.load_workbook(self.file)
         sheet = workbook.active
         data = []
 
         for row in sheet.iter_rows(min_row=from_row, values_only=True):
             if row:
-                data.append({
-                    'category': row[self.COLS.CATEGORY],
-                    'code': row[self.COLS.CODE],
-                    'name': row[self.COLS.NAME],
-                    'cost': row[self.COLS.COST],
-                })
-        return data
\ No newline at end of file
+                data.append(self.parse_row(row))
+        return data
+
+    def parse_row(self, row: tuple) -> dict:
+        return {
+            'category': row[self.COLS.CATEGORY],
+            'code': row[self.COLS.CODE],
+            'name': row[self.COLS.NAME],
+            'cost': row[self.COLS.COST],
+        }
+
+
+class CategoryExcelParser(ExcelParser):
+    ''' Разбор листа категорий: код, название, код родительской категории (пусто - корневая) '''
+    class COLS:
+        CODE = 0
+        NAME = 1
+        PARENT = 2
+
+    def parse_row(self, row: tuple) -> dict:
+        return {
+            'code': row[self.COLS.CODE],
+            'name': row[self.COLS.NAME],
+            'parent': row[self.COLS.PARENT] if len(row) > self.COLS.PARENT else None,
+        }
\ No newline at end of file
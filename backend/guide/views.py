@@ -1,28 +1,72 @@
-from django.db.models import Prefetch
+from django.db.models import Count, Prefetch
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView 
 from rest_framework.decorators import action
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiResponse, OpenApiExample
+from rest_framework.permissions import IsAdminUser
+from rest_framework.exceptions import ValidationError
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiResponse, OpenApiExample, OpenApiParameter
+
+from .models import Material, Category, MaterialImport
+from .serializers import (
+    MaterialSerializer,
+    MaterialAsOfSerializer,
+    MaterialPriceSerializer,
+    MaterialBulkUpdateSerializer,
+    MaterialBulkDeleteSerializer,
+    CategorySerializer,
+    CategoryMoveSerializer,
+    CategoryImportSerializer,
+    CategoryCompactSerializer,
+    CategoryMaterialsCountSerializer,
+    CategoryMaterialsPageSerializer,
+    CategoryTreeSerializer,
+)
+from .utils import ExcelParser, CategoryExcelParser, file_sha256, parse_moment
+from .hierarchy import delete_subtree, move_subtree
+from .imports import DUPLICATE, IN_PROGRESS, claim_import, complete_import, release_import
+from .prices import price_at, price_history, record_prices
+from .cache import category_lookup
 
-from .models import Material, Category
-from .serializers import MaterialSerializer, CategorySerializer, CategoryTreeSerializer
-from .utils import ExcelParser
+
+def get_moment_param(request: Request, name: str, end_of_day: bool = False):
+    ''' Дата или дата-время из параметра запроса; 400 при неверном формате '''
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    moment = parse_moment(value, end_of_day=end_of_day)
+    if moment is None:
+        raise ValidationError({name: ['Ожидается дата или дата-время в формате ISO 8601.']})
+    return moment
 
 
 @extend_schema_view(
     get=extend_schema(
         summary="Получение списка материалов",
-        description="Возвращает полный список всех материалов в базе данных.",
+        description=(
+            "Возвращает полный список всех материалов в базе данных. "
+            "С параметром as_of возвращает материалы со стоимостью, действовавшей на указанный момент."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='as_of',
+                description="Дата или дата-время ISO 8601; дата без времени означает конец дня.",
+                required=False,
+                type=str,
+            )
+        ],
         responses={200: MaterialSerializer(many=True)}
     ),
     post=extend_schema(
         summary="Создание нового материала или загрузка данных из Excel файла",
         description=(
             "Создает новый материал на основе данных из запроса или обрабатывает Excel файл. "
-            "Если загружены файлы с расширением .xlsx, они будут обработаны и материалы будут добавлены в базу данных."
+            "Если загружены файлы с расширением .xlsx, они будут обработаны и материалы будут добавлены в базу данных. "
+            "Файл с тем же содержимым, что и у уже импортированного, повторно не разбирается: возвращается "
+            "сохранённый итог импорта. Параметр force=true выполняет импорт заново."
         ),
         request={
             'multipart/form-data': {
@@ -32,15 +76,29 @@ from .utils import ExcelParser
                         'type': 'string',
                         'format': 'binary'
                     }
+                },
+                'force': {
+                    'type': 'boolean'
                 }
             }
         },
-        responses={201: MaterialSerializer, 400: 'Ошибка валидации данных'}
+        responses={
+            200: OpenApiResponse(description='Все файлы уже импортированы'),
+            201: MaterialSerializer,
+            400: 'Ошибка валидации данных',
+            409: 'Тот же файл уже импортируется',
+        }
     )
 )
 class MaterialListView(APIView):
     def get(self, request: Request) -> Response:
         ''' Получение списка материалов '''
+        as_of = get_moment_param(request, 'as_of', end_of_day=True)
+        if as_of is not None:
+            materials = Material.objects.annotate(as_of_cost=price_at(as_of)).filter(as_of_cost__isnull=False)
+            serializer = MaterialAsOfSerializer(materials, many=True)
+            return Response(serializer.data)
+
         materials = Material.objects.all()
         serializer = MaterialSerializer(materials, many=True)
         return Response(serializer.data)
@@ -49,34 +107,85 @@ class MaterialListView(APIView):
         ''' Создание нового материала или обработка загрузки Excel файлов '''
         if 'file' in request.FILES or 'files' in request.FILES:
             files = request.FILES.getlist('file') or request.FILES.getlist('files')
+            force = str(request.query_params.get('force', request.data.get('force', ''))).lower() in ('1', 'true')
             errors = []
+            imports = []
+            in_progress = []
 
             for file in files:
                 if file.name.endswith('.xlsx'):
+                    try:
+                        record, claim = claim_import(file_sha256(file), file.name, force)
+                    except Exception as e:
+                        errors.append(str(e))
+                        continue
+                    if claim == DUPLICATE:
+                        imports.append(self.import_summary(record, 'duplicate'))
+                        continue
+                    if claim == IN_PROGRESS:
+                        in_progress.append(file.name)
+                        continue
+
                     try:
                         parser = ExcelParser(file)
                         parsed_data = parser.parse(2)
+                        # Категории всего файла разрешаются одним запросом, строки проверяются по кэшу
+                        category_lookup.parents_for_ids(
+                            row['category'] for row in parsed_data if isinstance(row['category'], int)
+                        )
 
                         serializer = MaterialSerializer(data=parsed_data, many=True)
                         if serializer.is_valid():
-                            serializer.save()
+                            with transaction.atomic():
+                                record_prices(serializer.save())
+                                complete_import(record, file.name, {'created': len(parsed_data)})
+                            imports.append(self.import_summary(record, 'imported'))
                         else:
+                            release_import(record)
                             errors.append(serializer.errors)
                     except Exception as e:
+                        release_import(record)
                         errors.append(str(e))
                 else:
                     errors.append(f"Неподдерживаемый формат файла: {file.name}")
 
             if errors:
                 return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
-            return Response({'detail': 'Materials created successfully'}, status=status.HTTP_201_CREATED)
+            if in_progress:
+                return Response(
+                    {
+                        'detail': 'Import of the same file is already in progress, retry later',
+                        'in_progress': in_progress,
+                        'imports': imports,
+                    },
+                    status=status.HTTP_409_CONFLICT
+                )
+            if imports and all(summary['status'] == 'duplicate' for summary in imports):
+                # Все файлы уже импортированы: ничего не создано
+                return Response({'detail': 'Files already imported', 'imports': imports})
+            return Response(
+                {'detail': 'Materials created successfully', 'imports': imports},
+                status=status.HTTP_201_CREATED
+            )
         
         serializer = MaterialSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                record_prices([serializer.save()])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def import_summary(record: MaterialImport, import_status: str) -> dict:
+        ''' Итог импорта одного файла для ответа '''
+        return {
+            'filename': record.filename,
+            'content_hash': record.content_hash,
+            'status': import_status,
+            'imported_at': record.completed_at,
+            **record.result,
+        }
+
 
 @extend_schema_view(
     get=extend_schema(
@@ -114,18 +223,24 @@ class MaterialDetailView(APIView):
     def put(self, request: Request, id: int) -> Response:
         ''' Обновление материала '''
         material = self.get_object(id)
+        previous_costs = {material.id: material.cost}
         serializer = MaterialSerializer(material, data=request.data)
         if serializer.is_valid(): 
-            serializer.save()
+            with transaction.atomic():
+                record_prices([serializer.save()], previous_costs=previous_costs)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     def patch(self, request: Request, id: int) -> Response:
         ''' Частичное обновление материала '''
         material = self.get_object(id)
+        previous_costs = {material.id: material.cost}
         serializer = MaterialSerializer(material, data=request.data, partial=True)
         if serializer.is_valid(): 
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                if 'cost' in serializer.validated_data:
+                    record_prices([material], previous_costs=previous_costs)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -136,15 +251,94 @@ class MaterialDetailView(APIView):
         return Response({'detail': 'Material deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
 
 
+@extend_schema_view(
+    get=extend_schema(
+        summary="История цен материала",
+        description=(
+            "Возвращает изменения стоимости материала за период [from, to]. "
+            "Если указан from, первой записью идёт цена, действовавшая на этот момент."
+        ),
+        parameters=[
+            OpenApiParameter(name='from', description="Начало периода (дата или дата-время ISO 8601)", required=False, type=str),
+            OpenApiParameter(name='to', description="Конец периода (дата или дата-время ISO 8601)", required=False, type=str),
+        ],
+        responses={200: MaterialPriceSerializer(many=True), 404: 'Material not found'}
+    )
+)
+class MaterialPriceHistoryView(APIView):
+    def get(self, request: Request, id: int) -> Response:
+        ''' История цен материала '''
+        get_object_or_404(Material.objects.only('id'), id=id)
+
+        date_from = get_moment_param(request, 'from')
+        date_to = get_moment_param(request, 'to', end_of_day=True)
+        serializer = MaterialPriceSerializer(price_history(id, date_from, date_to), many=True)
+        return Response(serializer.data)
+
+
+@extend_schema_view(
+    patch=extend_schema(
+        summary="Массовое обновление материалов",
+        description=(
+            "Частично обновляет список материалов, найденных по id или code, одним пакетным запросом в транзакции. "
+            "Возвращает результат по каждому элементу: updated, not_found или invalid."
+        ),
+        request=MaterialBulkUpdateSerializer,
+        responses={200: OpenApiResponse(description='Результаты по каждому элементу'), 400: 'Ошибка валидации данных'}
+    ),
+    delete=extend_schema(
+        summary="Массовое удаление материалов",
+        description=(
+            "Удаляет материалы по спискам ids и/или codes одним запросом в транзакции. "
+            "Возвращает результат по каждому id и code: deleted или not_found."
+        ),
+        request=MaterialBulkDeleteSerializer,
+        responses={200: OpenApiResponse(description='Результаты по каждому элементу'), 400: 'Ошибка валидации данных'}
+    )
+)
+class MaterialBulkView(APIView):
+    def patch(self, request: Request) -> Response:
+        ''' Массовое частичное обновление материалов '''
+        serializer = MaterialBulkUpdateSerializer(data=request.data)
+        if serializer.is_valid():
+            results = serializer.save()
+            updated = sum(result['status'] == 'updated' for result in results)
+            return Response({'updated': updated, 'results': results})
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def delete(self, request: Request) -> Response:
+        ''' Массовое удаление материалов '''
+        serializer = MaterialBulkDeleteSerializer(data=request.data)
+        if serializer.is_valid():
+            results = serializer.save()
+            deleted = sum(result['status'] == 'deleted' for result in results)
+            return Response({'deleted': deleted, 'results': results})
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+CATEGORY_MATERIALS_PARAMETER = OpenApiParameter(
+    name='materials',
+    description=(
+        "Режим вывода материалов: all - все материалы (по умолчанию), none - без материалов, "
+        "count - количество материалов, page - количество и первая страница материалов."
+    ),
+    required=False,
+    type=str,
+    enum=['all', 'none', 'count', 'page'],
+)
+
+
 @extend_schema_view(
     list=extend_schema(
         summary="Получение списка категорий",
         description="Возвращает список всех категорий с их материалами.",
+        parameters=[CATEGORY_MATERIALS_PARAMETER],
         responses={200: CategorySerializer(many=True)}
     ),
     retrieve=extend_schema(
         summary="Получение категории по ID",
         description="Возвращает детальную информацию о категории и её материалах.",
+        parameters=[CATEGORY_MATERIALS_PARAMETER],
         responses={200: CategorySerializer}
     ),
     create=extend_schema(
@@ -164,7 +358,7 @@ class MaterialDetailView(APIView):
     ),
     destroy=extend_schema(
         summary="Удаление категории",
-        description="Удаляет категорию из базы данных.",
+        description="Удаляет категорию из базы данных вместе со всеми дочерними категориями и их материалами.",
         responses={204: 'Category deleted successfully'}
     )
 )
@@ -174,15 +368,163 @@ class CategoryViewSet(viewsets.ModelViewSet):
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    materials_serializer_classes = {
+        'all': CategorySerializer,
+        'none': CategoryCompactSerializer,
+        'count': CategoryMaterialsCountSerializer,
+        'page': CategoryMaterialsPageSerializer,
+    }
+    materials_page_size = 20
+
+    def get_materials_mode(self) -> str:
+        """
+        Режим вывода материалов из параметра ?materials= (только для чтения списка и категории).
+        """
+        if self.action not in ('list', 'retrieve'):
+            return 'all'
+        mode = self.request.query_params.get('materials', 'all')
+        if mode not in self.materials_serializer_classes:
+            raise ValidationError({
+                'materials': [f"Допустимые значения: {', '.join(self.materials_serializer_classes)}."]
+            })
+        return mode
+
+    def get_serializer_class(self):
+        return self.materials_serializer_classes[self.get_materials_mode()]
 
     def get_queryset(self):
         """
         Переопределение метода для оптимизации запросов (только для категорий и их материалов).
         """
+        if self.action in ('destroy', 'move', 'import_categories'):
+            return Category.objects.all()
+
+        mode = self.get_materials_mode()
+        if mode == 'none':
+            return Category.objects.all()
+        if mode == 'count':
+            return Category.objects.annotate(materials_count=Count('materials'))
+        if mode == 'page':
+            return Category.objects.annotate(materials_count=Count('materials')).prefetch_related(
+                Prefetch(
+                    'materials',
+                    queryset=Material.objects.all()[:self.materials_page_size],
+                    to_attr='materials_page',
+                )
+            )
         return Category.objects.prefetch_related(
             Prefetch('materials')
         ).all()
 
+    def perform_update(self, serializer):
+        """
+        Смена родителя выполняется через move_subtree: категория и цепочка
+        предков нового родителя блокируются, поэтому встречные изменения
+        не могут образовать цикл.
+        """
+        with transaction.atomic():
+            if 'parent' in serializer.validated_data:
+                parent = serializer.validated_data['parent']
+                if not move_subtree(serializer.instance.id, parent.id if parent is not None else None):
+                    raise ValidationError({'parent': ['Категория не может быть перенесена в собственное поддерево.']})
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        """
+        Удаление поддерева категории set-based запросами вместо каскадного удаления Django.
+        """
+        delete_subtree(instance.id)
+
+    @extend_schema(
+        summary="Статистика кэша поиска категорий",
+        description=(
+            "Возвращает счётчики попаданий и промахов кэша разрешения категорий по коду и id "
+            "для обработавшего запрос процесса (воркера). Доступно только администраторам."
+        ),
+        responses={200: OpenApiResponse(description='Статистика кэша')}
+    )
+    @action(detail=False, methods=['get'], url_path='lookup-cache', permission_classes=[IsAdminUser])
+    def lookup_cache(self, request):
+        """
+        Эндпоинт статистики кэша поиска категорий.
+        """
+        return Response(category_lookup.stats())
+
+    @extend_schema(
+        summary="Перенос категории",
+        description=(
+            "Переносит категорию вместе с дочерними категориями под другого родителя "
+            "(parent: null - в корень). Перенос в собственное поддерево запрещён."
+        ),
+        request=CategoryMoveSerializer,
+        responses={200: CategoryCompactSerializer, 400: 'Ошибка валидации данных'}
+    )
+    @action(detail=True, methods=['post'], url_path='move')
+    def move(self, request, pk=None):
+        """
+        Эндпоинт для переноса категории с поддеревом.
+        """
+        category = self.get_object()
+        serializer = CategoryMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        parent = serializer.validated_data['parent']
+        parent_id = parent.id if parent is not None else None
+        if not move_subtree(category.id, parent_id):
+            return Response(
+                {'parent': ['Категория не может быть перенесена в собственное поддерево.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        category.parent_id = parent_id
+        return Response(CategoryCompactSerializer(category).data)
+
+    @extend_schema(
+        summary="Импорт категорий из Excel файла",
+        description=(
+            "Создает категории из .xlsx файла со столбцами: код, название, код родительской категории "
+            "(пусто - корневая категория). Первая строка - заголовок. Родительская категория может "
+            "находиться в файле ниже дочерней или уже существовать в базе данных. "
+            "Файл проверяется целиком: при любой ошибке ни одна категория не создается."
+        ),
+        request={
+            'multipart/form-data': {
+                'file': {
+                    'type': 'string',
+                    'format': 'binary'
+                }
+            }
+        },
+        responses={201: OpenApiResponse(description='Количество созданных категорий'), 400: 'Ошибка валидации данных'}
+    )
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_categories(self, request):
+        """
+        Эндпоинт для импорта категорий из Excel файла.
+        """
+        file = request.FILES.get('file')
+        if file is None:
+            return Response({'errors': ['Файл не передан']}, status=status.HTTP_400_BAD_REQUEST)
+        if not file.name.endswith('.xlsx'):
+            return Response(
+                {'errors': [f"Неподдерживаемый формат файла: {file.name}"]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            rows = CategoryExcelParser(file).parse(CategoryImportSerializer.FIRST_ROW)
+        except Exception as e:
+            return Response({'errors': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = CategoryImportSerializer(data={'rows': rows})
+        if serializer.is_valid():
+            created = serializer.save()
+            return Response(
+                {'detail': 'Categories created successfully', 'created': created},
+                status=status.HTTP_201_CREATED
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     @extend_schema(
         summary="Получение категорий в виде дерева",
         description="Возвращает категории и их материалы в иерархической структуре.",
@@ -10,4 +10,16 @@ if [ "$DATABASE" = "postgres" ]; then
     echo "PostgreSQL started"
 fi
 
+echo "Creating cache table..."
+
+python manage.py createcachetable || { echo "Cache table creation failed" >&2; exit 1; }
+
+echo "Generating OpenAPI schema..."
+
+SCHEMA_DIR=${SCHEMA_DIR:-schema}
+mkdir -p "$SCHEMA_DIR"
+python manage.py spectacular --file "$SCHEMA_DIR/schema.yaml" \
+    && python manage.py spectacular --format openapi-json --file "$SCHEMA_DIR/schema.json" \
+    || echo "OpenAPI schema generation failed, it will be generated on request"
+
 exec "$@"
\ No newline at end of file
@@ -0,0 +1,365 @@
+"""
+Нагрузочное тестирование стека nginx -> gunicorn -> PostgreSQL.
+
+Запускается с хоста против поднятого docker compose стека (или любого адреса API)
+и использует только стандартную библиотеку; для сценария импорта нужен openpyxl.
+
+Примеры:
+    python loadtest/run.py --seed
+    python loadtest/run.py --scenario browse --users 32 --duration 60
+    python loadtest/run.py --scenario mixed --users 16 --duration 120 --json report.json
+
+Каждый виртуальный пользователь держит своё keep-alive соединение и в цикле
+выполняет взвешенно выбранные шаги сценария. По итогам выводятся пропускная
+способность, p50/p95/p99 задержки и доля ошибок по каждому эндпоинту.
+"""
+import argparse
+import http.client
+import io
+import json
+import math
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+
+class Client:
+    ''' HTTP клиент одного виртуального пользователя с постоянным соединением '''
+
+    def __init__(self, base_url: str, timeout: float) -> None:
+        url = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(url.hostname, url.port, timeout=timeout)
+
+    def request(self, method: str, path: str, body: bytes | None = None, headers: dict | None = None):
+        try:
+            self.connection.request(method, path, body=body, headers=headers or {})
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Соединение сброшено сервером (таймаут keep-alive, перезапуск воркера): переподключаемся
+            self.connection.close()
+            raise
+
+    def json(self, method: str, path: str, data=None):
+        body = json.dumps(data).encode() if data is not None else None
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        return self.request(method, path, body, headers)
+
+    def upload(self, path: str, field: str, filename: str, content: bytes):
+        boundary = uuid.uuid4().hex
+        body = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            'Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet\r\n\r\n'
+        ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+        return self.request('POST', path, body, {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+
+class Recorder:
+    ''' Потокобезопасный сбор задержек и ошибок по эндпоинтам '''
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def add(self, endpoint: str, latency: float, status: int | None) -> None:
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            self.statuses[endpoint][status or 'exception'] += 1
+            if status is None or status >= 400:
+                self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> list[dict]:
+        rows = []
+        all_latencies = []
+        for endpoint in sorted(self.latencies):
+            latencies = sorted(self.latencies[endpoint])
+            all_latencies.extend(latencies)
+            rows.append(self.summarize(endpoint, latencies, self.errors[endpoint], elapsed))
+            rows[-1]['statuses'] = {str(status): count for status, count in self.statuses[endpoint].items()}
+        rows.append(self.summarize('TOTAL', sorted(all_latencies), sum(self.errors.values()), elapsed))
+        return rows
+
+    @staticmethod
+    def summarize(endpoint: str, latencies: list[float], errors: int, elapsed: float) -> dict:
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            # Метод ближайшего ранга
+            return latencies[max(0, math.ceil(p / 100 * len(latencies)) - 1)] * 1000
+
+        return {
+            'endpoint': endpoint,
+            'requests': len(latencies),
+            'rps': len(latencies) / elapsed if elapsed else 0.0,
+            'errors': errors,
+            'error_rate': errors / len(latencies) if latencies else 0.0,
+            'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+            'p50_ms': percentile(50),
+            'p95_ms': percentile(95),
+            'p99_ms': percentile(99),
+            'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+class Catalogue:
+    ''' Известные id категорий и материалов, общие для виртуальных пользователей '''
+
+    def __init__(self, category_ids: list[int], material_ids: list[int]) -> None:
+        self.category_ids = category_ids
+        self.material_ids = material_ids
+        self.lock = threading.Lock()
+        self.next_code = random.randint(10 ** 8, 10 ** 9)
+
+    def material_codes(self, count: int) -> range:
+        with self.lock:
+            start = self.next_code
+            self.next_code += count
+        return range(start, start + count)
+
+
+def make_workbook(header: list, rows: list[list]) -> bytes:
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        sys.exit('Для сценариев с импортом нужен openpyxl: pip install openpyxl')
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def materials_workbook(catalogue: Catalogue, rows: int) -> bytes:
+    return make_workbook(
+        ['Category', 'Code', 'Name', 'Cost'],
+        [
+            [random.choice(catalogue.category_ids), code, f'Load test {code}', round(random.uniform(1, 1000), 2)]
+            for code in catalogue.material_codes(rows)
+        ],
+    )
+
+
+# Шаги сценариев: (эндпоинт для отчёта, функция(client, catalogue, options, state) -> HTTP статус)
+
+def browse_categories(client, catalogue, options, state):
+    return client.json('GET', '/categories/?materials=count')[0]
+
+
+def browse_category(client, catalogue, options, state):
+    category_id = random.choice(catalogue.category_ids)
+    return client.json('GET', f'/categories/{category_id}/?materials=page')[0]
+
+
+def browse_material(client, catalogue, options, state):
+    material_id = random.choice(catalogue.material_ids)
+    return client.json('GET', f'/materials/{material_id}/')[0]
+
+
+def browse_material_prices(client, catalogue, options, state):
+    material_id = random.choice(catalogue.material_ids)
+    return client.json('GET', f'/materials/{material_id}/prices/')[0]
+
+
+def list_materials(client, catalogue, options, state):
+    return client.json('GET', '/materials/')[0]
+
+
+def poll_tree(client, catalogue, options, state):
+    return client.json('GET', '/categories/tree/')[0]
+
+
+def import_materials(client, catalogue, options, state):
+    content = materials_workbook(catalogue, options.import_rows)
+    return client.upload('/materials/', 'files', 'loadtest.xlsx', content)[0]
+
+
+def create_material(client, catalogue, options, state):
+    code = catalogue.material_codes(1)[0]
+    status, body = client.json('POST', '/materials/', {
+        'category': random.choice(catalogue.category_ids),
+        'code': code,
+        'name': f'Load test {code}',
+        'cost': f'{random.uniform(1, 1000):.2f}',
+    })
+    if status == 201:
+        state.setdefault('created', []).append(json.loads(body)['id'])
+    return status
+
+
+def update_material(client, catalogue, options, state):
+    material_id = random.choice(state.get('created') or catalogue.material_ids)
+    return client.json('PATCH', f'/materials/{material_id}/', {'cost': f'{random.uniform(1, 1000):.2f}'})[0]
+
+
+def bulk_update_materials(client, catalogue, options, state):
+    ids = random.sample(catalogue.material_ids, min(len(catalogue.material_ids), options.bulk_size))
+    items = [{'id': material_id, 'cost': f'{random.uniform(1, 1000):.2f}'} for material_id in ids]
+    return client.json('PATCH', '/materials/bulk/', {'items': items})[0]
+
+
+def delete_material(client, catalogue, options, state):
+    created = state.get('created')
+    if not created:
+        # Удалять нечего: материал создаётся и учитывается как POST, чтобы не искажать статистику DELETE
+        return 'POST /materials/', create_material(client, catalogue, options, state)
+    return client.json('DELETE', f'/materials/{created.pop()}/')[0]
+
+
+SCENARIOS = {
+    'browse': [
+        ('GET /categories/?materials=count', browse_categories, 2),
+        ('GET /categories/<id>/?materials=page', browse_category, 4),
+        ('GET /materials/<id>/', browse_material, 8),
+        ('GET /materials/<id>/prices/', browse_material_prices, 2),
+        ('GET /materials/', list_materials, 1),
+    ],
+    'tree': [
+        ('GET /categories/tree/', poll_tree, 1),
+    ],
+    'import': [
+        ('POST /materials/ (xlsx)', import_materials, 1),
+    ],
+    'mixed': [
+        ('GET /categories/<id>/?materials=page', browse_category, 4),
+        ('GET /materials/<id>/', browse_material, 6),
+        ('GET /categories/tree/', poll_tree, 1),
+        ('POST /materials/', create_material, 2),
+        ('PATCH /materials/<id>/', update_material, 2),
+        ('PATCH /materials/bulk/', bulk_update_materials, 1),
+        ('DELETE /materials/<id>/', delete_material, 1),
+    ],
+}
+
+
+def virtual_user(options, catalogue: Catalogue, recorder: Recorder, deadline: float) -> None:
+    client = Client(options.base_url, options.timeout)
+    steps = SCENARIOS[options.scenario]
+    weights = [weight for _, _, weight in steps]
+    state = {}
+
+    while time.monotonic() < deadline:
+        endpoint, step, _ = random.choices(steps, weights)[0]
+        started = time.perf_counter()
+        try:
+            status = step(client, catalogue, options, state)
+        except (OSError, http.client.HTTPException, ValueError):
+            status = None
+        if isinstance(status, tuple):
+            # Шаг выполнил запрос к другому эндпоинту и сообщает, куда его учесть
+            endpoint, status = status
+        recorder.add(endpoint, time.perf_counter() - started, status)
+        if options.think_time:
+            time.sleep(random.expovariate(1 / options.think_time))
+
+
+def seed(options) -> None:
+    ''' Наполняет справочник иерархией категорий и материалами через API импорта '''
+    client = Client(options.base_url, options.timeout)
+    status, body = client.json('GET', '/categories/?materials=none')
+    existing_codes = {category['code'] for category in json.loads(body)} if status == 200 else set()
+
+    free_codes = [code for code in range(1, 32768) if code not in existing_codes][:options.seed_categories]
+    rows = []
+    for index, code in enumerate(free_codes):
+        # Первые категории - корневые, остальные вешаются на случайную ранее созданную
+        parent = random.choice(free_codes[:index]) if index >= 10 else None
+        rows.append([code, f'Load test {code}', parent])
+    status, body = client.upload('/categories/import/', 'file', 'categories.xlsx', make_workbook(['Code', 'Name', 'Parent'], rows))
+    print(f'Категории: {status} {body[:200].decode(errors="replace")}')
+
+    catalogue = load_catalogue(client)
+    for offset in range(0, options.seed_materials, options.import_rows):
+        content = materials_workbook(catalogue, min(options.import_rows, options.seed_materials - offset))
+        status, body = client.upload('/materials/', 'files', 'materials.xlsx', content)
+        print(f'Материалы {offset}+: {status} {body[:200].decode(errors="replace")}')
+
+
+def load_catalogue(client: Client) -> Catalogue:
+    status, body = client.json('GET', '/categories/?materials=none')
+    if status != 200:
+        sys.exit(f'Не удалось получить категории: HTTP {status}')
+    category_ids = [category['id'] for category in json.loads(body)]
+    status, body = client.json('GET', '/materials/')
+    material_ids = [material['id'] for material in json.loads(body)] if status == 200 else []
+    return Catalogue(category_ids, material_ids)
+
+
+def print_report(rows: list[dict]) -> None:
+    header = f'{"Эндпоинт":<40} {"Запросов":>9} {"RPS":>8} {"Ошибки":>8} {"p50 мс":>9} {"p95 мс":>9} {"p99 мс":>9} {"max мс":>9}'
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(
+            f'{row["endpoint"]:<40} {row["requests"]:>9} {row["rps"]:>8.1f} {row["error_rate"]:>7.1%} '
+            f'{row["p50_ms"]:>9.1f} {row["p95_ms"]:>9.1f} {row["p99_ms"]:>9.1f} {row["max_ms"]:>9.1f}'
+        )
+
+
+def positive_int(value: str) -> int:
+    ''' Тип аргумента argparse: целое число не меньше 1 '''
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'ожидается целое число не меньше 1: {value}')
+    return number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost', help='Адрес API (nginx)')
+    parser.add_argument('--scenario', choices=SCENARIOS, default='mixed', help='Сценарий нагрузки')
+    parser.add_argument('--users', type=positive_int, default=16, help='Количество одновременных виртуальных пользователей')
+    parser.add_argument('--duration', type=float, default=60, help='Длительность теста в секундах')
+    parser.add_argument('--ramp-up', type=float, default=5, help='Время запуска всех пользователей в секундах')
+    parser.add_argument('--think-time', type=float, default=0, help='Средняя пауза между шагами пользователя в секундах')
+    parser.add_argument('--timeout', type=float, default=30, help='Таймаут HTTP запроса в секундах')
+    parser.add_argument('--import-rows', type=int, default=500, help='Строк в одном импортируемом файле')
+    parser.add_argument('--bulk-size', type=int, default=100, help='Материалов в одном массовом обновлении')
+    parser.add_argument('--seed', action='store_true', help='Только наполнить справочник тестовыми данными')
+    parser.add_argument('--seed-categories', type=int, default=200, help='Количество категорий при наполнении')
+    parser.add_argument('--seed-materials', type=int, default=5000, help='Количество материалов при наполнении')
+    parser.add_argument('--json', help='Сохранить отчёт в JSON файл')
+    options = parser.parse_args()
+
+    if options.seed:
+        seed(options)
+        return
+
+    catalogue = load_catalogue(Client(options.base_url, options.timeout))
+    if not catalogue.category_ids or not catalogue.material_ids:
+        sys.exit('Справочник пуст: сначала запустите с --seed')
+
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + options.duration
+    threads = []
+    for index in range(options.users):
+        thread = threading.Thread(target=virtual_user, args=(options, catalogue, recorder, deadline), daemon=True)
+        thread.start()
+        threads.append(thread)
+        time.sleep(options.ramp_up / options.users)
+    for thread in threads:
+        thread.join()
+
+    rows = recorder.report(time.monotonic() - started)
+    print(f'Сценарий {options.scenario}: {options.users} пользователей, {options.duration:.0f} с, {options.base_url}\n')
+    print_report(rows)
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as file:
+            json.dump({'scenario': options.scenario, 'users': options.users, 'endpoints': rows}, file, ensure_ascii=False, indent=4)
+
+
+if __name__ == '__main__':
+    main()